@@ -1,28 +1,135 @@
-from flask import Flask, jsonify, request, Response, send_from_directory
+import time
+_MODULE_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, g, jsonify, request, Response, send_from_directory
 from flask_cors import CORS
-from azure.storage.blob import BlobServiceClient
-import pandas as pd
-from io import StringIO
+import brotli
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO, StringIO
+from werkzeug.datastructures import MultiDict
+from werkzeug.utils import get_content_type
+import base64
+import bisect
+import gzip
+import glob
+import hashlib
+import importlib
+import io
+import json
+import multiprocessing
+import mimetypes
 import os
-import time
+import re
+import resource
+import tempfile
+import threading
+import unicodedata
+import uuid
+import zlib
 from config import (
     STORAGE_ACCOUNT_NAME, 
     STORAGE_ACCOUNT_KEY, 
     CONTAINER_NAME, 
     BLOB_NAME,
     BLOB_NAME_PIB,
+    BLOB_PREFIX,
+    PARTITION_LOAD_WORKERS,
+    STREAMING_MODE,
+    SPILL_DIR,
+    STREAM_BLOCK_BYTES,
     CONNECTION_STRING,
     CORS_ORIGINS,
     CACHE_TTL_SECONDS,
+    EXPORT_CACHE_DIR,
+    EXPORT_WORKERS,
+    EXPORT_MAX_PENDING,
+    EXPORT_CACHE_MAX_BYTES,
+    EXPORT_JOB_TTL_SECONDS,
+    EXPORT_MAX_JOBS,
+    COMPRESSION_MIN_BYTES,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_BROTLI_QUALITY,
+    ADMISSION_CHEAP_CONCURRENCY,
+    ADMISSION_CHEAP_QUEUE,
+    ADMISSION_CHEAP_WAIT_SECONDS,
+    ADMISSION_HEAVY_CONCURRENCY,
+    ADMISSION_HEAVY_QUEUE,
+    ADMISSION_HEAVY_WAIT_SECONDS,
+    MEMORY_BUDGET_MB,
+    COMPUTE_WORKERS,
+    COMPUTE_TIMEOUT_SECONDS,
+    CHANGES_HISTORY_VERSIONS,
+    STARTUP_MODE,
     FLASK_ENV,
     FLASK_HOST,
     FLASK_PORT,
     FLASK_DEBUG
 )
 
+class _LazyModule:
+    """Proxy que importa el módulo (o atributo) real en el primer acceso.
+
+    pandas, pyarrow, numpy y el SDK de Azure suman cerca de un segundo de import;
+    así /api/health y los estáticos responden sin esperar a la pila de datos.
+    """
+
+    def __init__(self, module_name, attribute=None):
+        self._module_name = module_name
+        self._attribute = attribute
+        self._target = None
+
+    def _load(self):
+        if self._target is None:
+            # Toda la pila se importa junta: importar pandas desde dos hilos a la vez (el de
+            # warmup y pyarrow.to_pandas en una petición) deja módulos a medio inicializar
+            warm_heavy_imports()
+        return self._target
+
+    def _import_target(self):
+        if self._target is None:
+            module = importlib.import_module(self._module_name)
+            self._target = getattr(module, self._attribute) if self._attribute else module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+
+pd = _LazyModule('pandas')
+np = _LazyModule('numpy')
+pa = _LazyModule('pyarrow')
+pc = _LazyModule('pyarrow.compute')
+pa_csv = _LazyModule('pyarrow.csv')
+pq = _LazyModule('pyarrow.parquet')
+msgpack = _LazyModule('msgpack')
+BlobServiceClient = _LazyModule('azure.storage.blob', 'BlobServiceClient')
+_HEAVY_MODULES = (pd, np, pa, pc, pa_csv, pq, msgpack, BlobServiceClient)
+
+# Tiempos de arranque (se exponen en /api/debug)
+_STARTUP_STATS = {'mode': STARTUP_MODE, 'heavy_ready': False}
+_HEAVY_IMPORT_LOCK = threading.Lock()
+
+
+def warm_heavy_imports():
+    """Importa la pila de datos completa una sola vez; en modo background corre en un hilo aparte"""
+    with _HEAVY_IMPORT_LOCK:
+        if _STARTUP_STATS['heavy_ready']:
+            return
+        started = time.perf_counter()
+        for module in _HEAVY_MODULES:
+            module._import_target()
+        _STARTUP_STATS['heavy_imports_seconds'] = round(time.perf_counter() - started, 4)
+        _STARTUP_STATS['heavy_ready'] = True
+    print(f"Pila de datos importada en {_STARTUP_STATS['heavy_imports_seconds']:.3f}s ({STARTUP_MODE})")
+
 # Configurar Flask para servir archivos estáticos del frontend
 static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend', 'dist')
-app = Flask(__name__, static_folder=static_folder, static_url_path='')
+# Sin la ruta static automática de Flask: serve() atiende assets y rutas de React
+# (con static_url_path='' la ruta automática tapaba al catch-all y React Router daba 404)
+app = Flask(__name__, static_folder=None)
+app.static_folder = static_folder
 
 # Configurar modo de producción
 app.config['ENV'] = FLASK_ENV
@@ -41,6 +148,225 @@ if CORS_ORIGINS == ['*']:
 else:
     CORS(app, origins=CORS_ORIGINS)  # Solo permite orígenes específicos (producción)
 
+# ==================== CONTROL DE ADMISIÓN ====================
+
+class AdmissionLane:
+    """Carril con concurrencia máxima, cola de espera acotada y tiempo máximo de espera"""
+
+    def __init__(self, name, concurrency, queue_size, wait_seconds):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.wait_seconds = wait_seconds
+        self.active = 0
+        self.waiting = 0
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected_full': 0, 'rejected_timeout': 0, 'max_active': 0}
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline_seconds=None):
+        """Intenta entrar al carril; devuelve False si se debe rechazar la petición"""
+        wait = self.wait_seconds if deadline_seconds is None else min(self.wait_seconds, deadline_seconds)
+        with self._cond:
+            if self.active >= self.concurrency:
+                if self.waiting >= self.queue_size or wait <= 0:
+                    self.stats['rejected_full'] += 1
+                    return False
+                self.waiting += 1
+                self.stats['queued'] += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: self.active < self.concurrency, timeout=wait)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.stats['rejected_timeout'] += 1
+                    return False
+            self.active += 1
+            self.stats['admitted'] += 1
+            self.stats['max_active'] = max(self.stats['max_active'], self.active)
+            return True
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def snapshot(self):
+        return dict(self.stats, active=self.active, waiting=self.waiting,
+                    concurrency=self.concurrency, queue_size=self.queue_size)
+
+
+_ADMISSION_LANES = {
+    'cheap': AdmissionLane('cheap', ADMISSION_CHEAP_CONCURRENCY, ADMISSION_CHEAP_QUEUE,
+                           ADMISSION_CHEAP_WAIT_SECONDS),
+    'heavy': AdmissionLane('heavy', ADMISSION_HEAVY_CONCURRENCY, ADMISSION_HEAVY_QUEUE,
+                           ADMISSION_HEAVY_WAIT_SECONDS),
+}
+
+# Endpoints que escanean o exportan el dataset completo; el resto de /api va a 'cheap'
+_HEAVY_ENDPOINTS = {
+    'get_data',
+    'get_municipio_data',
+    'get_stats',
+    'comparison',
+    'download_data',
+    'get_pib_data_endpoint',
+    'get_pib_municipio_data',
+    'get_pib_stats',
+    'download_pib_data',
+    'query',
+    'get_analytics',
+    'get_matrix_endpoint',
+    'get_changes',
+    'chart_data',
+    'debug_info',
+}
+# Nunca se limitan: health checks y archivos estáticos
+_ADMISSION_EXEMPT = {'health_check', 'index', 'serve'}
+
+
+@app.before_request
+def admit_request():
+    """Asigna la petición a un carril y la rechaza rápido (503) si está saturado"""
+    endpoint = request.endpoint
+    if endpoint is None or endpoint in _ADMISSION_EXEMPT or request.method == 'OPTIONS':
+        return None
+    lane = _ADMISSION_LANES['heavy' if endpoint in _HEAVY_ENDPOINTS else 'cheap']
+
+    # Deadline opcional del cliente (ms): no tiene sentido esperar más que eso en cola
+    deadline_ms = request.headers.get('X-Request-Deadline-Ms', type=int)
+    deadline = deadline_ms / 1000 if deadline_ms is not None else None
+    if not lane.acquire(deadline):
+        response = jsonify({
+            'success': False,
+            'error': f'Servidor ocupado (carril {lane.name}), intenta de nuevo más tarde'
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(max(1, int(lane.wait_seconds)))
+        return response
+    g.admission_lane = lane
+    return None
+
+
+@app.after_request
+def hold_admission_while_streaming(response):
+    """Un cuerpo por streaming (descargas comprimidas, Parquet) se genera después del
+    teardown: el carril pasa a liberarse cuando el servidor cierra la respuesta"""
+    if response.is_streamed:
+        lane = g.pop('admission_lane', None)
+        if lane is not None:
+            response.call_on_close(lane.release)
+    return response
+
+
+@app.teardown_request
+def release_admission(exc):
+    """Libera el carril al terminar la petición, haya fallado o no"""
+    lane = g.pop('admission_lane', None)
+    if lane is not None:
+        lane.release()
+
+# ==================== PRESUPUESTO DE MEMORIA ====================
+
+class MemoryBudget:
+    """Contabilidad central de memoria por nivel (snapshot, índice, cache).
+
+    Cada entrada registra sus bytes y, si es reconstruible, una función para
+    liberarla. Al superar el presupuesto se desalojan primero las entradas de
+    menor valor: caches antes que índices, y dentro de cada nivel la usada hace
+    más tiempo. Las entradas fijas (snapshots vigentes, assets) solo se reportan.
+    """
+
+    # Menor peso = se desaloja antes
+    TIER_WEIGHTS = {'cache': 0, 'index': 1, 'partition': 2, 'snapshot': 3, 'static': 4}
+
+    def __init__(self, limit_bytes):
+        self.limit_bytes = limit_bytes
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, tier, key, nbytes, evict=None):
+        """Registra (o reemplaza) una entrada; sin evict la entrada queda fija"""
+        with self._lock:
+            self._entries[(tier, key)] = {
+                'bytes': int(nbytes), 'evict': evict, 'last_used': time.monotonic()
+            }
+        self.enforce()
+
+    def unregister(self, tier, key):
+        with self._lock:
+            self._entries.pop((tier, key), None)
+
+    def touch(self, tier, key):
+        entry = self._entries.get((tier, key))
+        if entry is not None:
+            entry['last_used'] = time.monotonic()
+
+    def used_bytes(self):
+        with self._lock:
+            return sum(entry['bytes'] for entry in self._entries.values())
+
+    def enforce(self):
+        """Desaloja entradas reconstruibles hasta volver a quedar dentro del presupuesto"""
+        victims = []
+        with self._lock:
+            used = sum(entry['bytes'] for entry in self._entries.values())
+            if used <= self.limit_bytes:
+                return
+            candidates = sorted(
+                ((key, entry) for key, entry in self._entries.items() if entry['evict']),
+                key=lambda item: (self.TIER_WEIGHTS.get(item[0][0], 0), item[1]['last_used'])
+            )
+            for key, entry in candidates:
+                if used <= self.limit_bytes:
+                    break
+                del self._entries[key]
+                used -= entry['bytes']
+                victims.append((key, entry))
+        for (tier, key), entry in victims:
+            self.evictions += 1
+            self.evicted_bytes += entry['bytes']
+            print(f"Memoria: desalojando {tier}/{key} ({entry['bytes'] / 1024 / 1024:.1f} MB)")
+            try:
+                entry['evict']()
+            except Exception as e:
+                print(f"Error al desalojar {tier}/{key}: {e}")
+        if used > self.limit_bytes:
+            print(f"Memoria: {used / 1024 / 1024:.1f} MB en uso supera el presupuesto "
+                  f"de {self.limit_bytes / 1024 / 1024:.0f} MB solo con entradas fijas")
+
+    def report(self):
+        """Desglose por nivel y por entrada para /api/debug"""
+        with self._lock:
+            tiers = {}
+            entries = []
+            for (tier, key), entry in self._entries.items():
+                summary = tiers.setdefault(tier, {'bytes': 0, 'entries': 0})
+                summary['bytes'] += entry['bytes']
+                summary['entries'] += 1
+                entries.append({'tier': tier, 'key': key, 'bytes': entry['bytes'],
+                                'evictable': entry['evict'] is not None})
+        entries.sort(key=lambda e: e['bytes'], reverse=True)
+        return {
+            'budget_bytes': self.limit_bytes,
+            'used_bytes': sum(t['bytes'] for t in tiers.values()),
+            'tiers': tiers,
+            'entries': entries,
+            'evictions': self.evictions,
+            'evicted_bytes': self.evicted_bytes,
+            # ru_maxrss está en KB en Linux
+            'process_max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        }
+
+
+def frame_nbytes(df, deep=True):
+    """Bytes de un DataFrame; deep=False cuando los strings se comparten con otro frame"""
+    return int(df.memory_usage(index=True, deep=deep).sum())
+
+
+MEMORY_BUDGET = MemoryBudget(MEMORY_BUDGET_MB * 1024 * 1024)
+
 # Cache simple en memoria para radianza
 _CACHE_TTL_SECONDS = CACHE_TTL_SECONDS
 _CACHED_DF = None
@@ -50,8 +376,118 @@ _CACHED_AT = 0.0
 _CACHED_PIB_DF = None
 _CACHED_PIB_AT = 0.0
 
+# Esquemas declarados para la ingesta de cada dataset.
+# - dtypes: tipo Arrow por columna (las columnas ausentes en el CSV se ignoran)
+# - date_formats: formatos strptime aceptados para las columnas de fecha
+# - decimal_comma: columnas numéricas que pueden venir con coma decimal ("12,5")
+RADIANZA_SCHEMA = {
+    'dtypes': {
+        'Fecha': 'timestamp[ns]',
+        'Municipio': 'string',
+        'Media_de_radianza': 'float64',
+        'Maximo_de_radianza': 'float64',
+        'Minimo_de_radianza': 'float64',
+        'Suma_de_radianza': 'float64',
+        'Cantidad_de_pixeles': 'int64',
+    },
+    'date_formats': ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y'],
+    'decimal_comma': [],
+}
+
+PIB_SCHEMA = {
+    'dtypes': {
+        'fecha': 'timestamp[ns]',
+        'municipio': 'string',
+        'entidad_federativa': 'string',
+    },
+    'date_formats': ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y'],
+    'decimal_comma': ['porc_pob', 'pibe', 'pib_mun'],
+}
+
+# Métricas de la última ingesta por dataset (se exponen en /api/debug)
+_INGEST_STATS = {}
+
+# Versión del snapshot cargado por dataset (hash del contenido del blob)
+_SNAPSHOT_VERSIONS = {}
+
+
+def _download_blob_bytes(blob_name):
+    """Descarga el blob completo y devuelve los bytes sin decodificar"""
+    blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
+    blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME, blob=blob_name)
+    return blob_client.download_blob().readall()
+
+
+def _parse_csv_bytes(data, schema, dataset):
+    """Parsea un CSV directamente desde bytes con el lector multihilo de Arrow.
+
+    Aplica el esquema declarado (tipos, formatos de fecha y coma decimal) durante
+    el parseo, sin decodificar a str ni pasar por StringIO. Si el CSV no cumple el
+    esquema se recurre a la inferencia de pandas para no romper la carga.
+    """
+    start = time.perf_counter()
+    decimal_cols = set(schema.get('decimal_comma', []))
+    column_types = {col: pa.type_for_alias(alias) for col, alias in schema['dtypes'].items()}
+    # Las columnas con coma decimal se leen como texto y se convierten en Arrow
+    column_types.update({col: pa.string() for col in decimal_cols})
+
+    try:
+        table = pa_csv.read_csv(
+            pa.py_buffer(data),
+            read_options=pa_csv.ReadOptions(use_threads=True),
+            convert_options=pa_csv.ConvertOptions(
+                column_types=column_types,
+                timestamp_parsers=schema.get('date_formats', []) + [pa_csv.ISO8601],
+                strings_can_be_null=True,
+            ),
+        )
+        for col in decimal_cols:
+            if col not in table.column_names:
+                continue
+            normalized = pc.replace_substring(table[col], ',', '.')
+            try:
+                converted = pc.cast(normalized, pa.float64())
+            except pa.ArrowInvalid:
+                # Valores no numéricos: se convierten a NaN en vez de fallar
+                converted = pa.array(
+                    pd.to_numeric(normalized.to_pandas(), errors='coerce'), type=pa.float64()
+                )
+            table = table.set_column(table.column_names.index(col), col, converted)
+        df = table.to_pandas()
+        engine = 'pyarrow'
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        print(f"Esquema de {dataset} no aplicable ({e}); usando inferencia de pandas")
+        df = pd.read_csv(BytesIO(data))
+        for col in decimal_cols:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '.'), errors='coerce')
+        for col, alias in schema['dtypes'].items():
+            if col in df.columns and alias.startswith('timestamp'):
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+        engine = 'pandas'
+
+    elapsed = time.perf_counter() - start
+    size_mb = len(data) / (1024 * 1024)
+    throughput = size_mb / elapsed if elapsed > 0 else 0.0
+    _INGEST_STATS[dataset] = {
+        'engine': engine,
+        'bytes': len(data),
+        'rows': len(df),
+        'parse_seconds': round(elapsed, 4),
+        'throughput_mb_s': round(throughput, 2),
+    }
+    print(f"Ingesta {dataset}: {size_mb:.2f} MB, {len(df)} filas en {elapsed:.3f}s "
+          f"({throughput:.1f} MB/s, motor {engine})")
+    return df
+
+
 def get_blob_data():
     """Obtiene los datos del blob storage y los convierte a DataFrame"""
+    if STREAMING_MODE:
+        # Modo out-of-core: la memoria pico la acota el tamaño de bloque, así que el snapshot
+        # completo nunca se arma; los endpoints usan los agregados o escanean el spill por rango
+        raise ValueError('En modo streaming el snapshot completo no se carga en memoria; '
+                         'filtra por fecha o municipio')
     try:
         # Validar que las credenciales estén configuradas
         if not STORAGE_ACCOUNT_KEY:
@@ -65,30 +501,28 @@ def get_blob_data():
         if _CACHED_DF is not None and (now - _CACHED_AT) < _CACHE_TTL_SECONDS:
             return _CACHED_DF
 
-        blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
+        if BLOB_PREFIX:
+            # Layout particionado: el snapshot completo se concatena a pedido y no se guarda;
+            # las particiones siguen en su cache desalojable y el concatenado vive lo que la petición
+            partitions = list_radianza_partitions()
+            df = load_radianza_partitions(partitions)
+            _SNAPSHOT_VERSIONS['radianza'] = _partitions_version(partitions)
+            record_snapshot_history('radianza', df)
+            return df
+
         print(f"Blob name: {BLOB_NAME}")
-        blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME, blob=BLOB_NAME)
-        
-        stream = blob_client.download_blob()
-        data = stream.readall().decode('utf-8')
-        
-        df = pd.read_csv(StringIO(data))
-        
-        # Asegurar que las columnas de fecha se manejen correctamente
-        if 'Fecha' in df.columns:
-            # Intentar convertir a datetime, pero mantener como string si falla
-            try:
-                df['Fecha'] = pd.to_datetime(df['Fecha'])
-            except Exception:
-                # Mantener como string si falla
-                pass
+        data = _download_blob_bytes(BLOB_NAME)
+        df = _parse_csv_bytes(data, RADIANZA_SCHEMA, 'radianza')
+        _SNAPSHOT_VERSIONS['radianza'] = hashlib.sha1(data).hexdigest()[:16]
 
         # Normalización ligera
         if 'Municipio' in df.columns:
             df['Municipio'] = df['Municipio'].astype(str)
         
+        record_snapshot_history('radianza', df)
         _CACHED_DF = df
         _CACHED_AT = now
+        MEMORY_BUDGET.register('snapshot', 'radianza', frame_nbytes(df))
         return _CACHED_DF
     except Exception as e:
         import traceback
@@ -111,21 +545,11 @@ def get_pib_data():
         if _CACHED_PIB_DF is not None and (now - _CACHED_PIB_AT) < _CACHE_TTL_SECONDS:
             return _CACHED_PIB_DF
 
-        blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
         print(f"Blob name PIB: {BLOB_NAME_PIB}")
-        blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME, blob=BLOB_NAME_PIB)
-        
-        stream = blob_client.download_blob()
-        data = stream.readall().decode('utf-8')
-        
-        df = pd.read_csv(StringIO(data))
-        
-        # Asegurar que las columnas de fecha se manejen correctamente
-        if 'fecha' in df.columns:
-            try:
-                df['fecha'] = pd.to_datetime(df['fecha'])
-            except Exception:
-                pass
+        data = _download_blob_bytes(BLOB_NAME_PIB)
+        # porc_pob, pibe y pib_mun se convierten a float durante el parseo (coma decimal)
+        df = _parse_csv_bytes(data, PIB_SCHEMA, 'pib')
+        _SNAPSHOT_VERSIONS['pib'] = hashlib.sha1(data).hexdigest()[:16]
 
         # Normalización ligera
         if 'municipio' in df.columns:
@@ -133,14 +557,10 @@ def get_pib_data():
         if 'entidad_federativa' in df.columns:
             df['entidad_federativa'] = df['entidad_federativa'].astype(str)
         
-        # Convertir columnas numéricas (pueden tener comas como separador decimal)
-        numeric_cols = ['porc_pob', 'pibe', 'pib_mun']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.replace(',', '.').astype(float, errors='ignore')
-        
+        record_snapshot_history('pib', df)
         _CACHED_PIB_DF = df
         _CACHED_PIB_AT = now
+        MEMORY_BUDGET.register('snapshot', 'pib', frame_nbytes(df))
         return _CACHED_PIB_DF
     except Exception as e:
         import traceback
@@ -148,62 +568,1466 @@ def get_pib_data():
         print(error_msg)
         raise Exception(error_msg)
 
-@app.route('/api/data', methods=['GET'])
-def get_data():
-    """Endpoint para obtener todos los datos"""
-    try:
-        df = get_blob_data().copy()
+# ==================== PARTICIONES DE RADIANZA ====================
 
-        # Parámetros de query
-        limit = request.args.get('limit', type=int)
-        columns = request.args.get('columns')  # coma separada
-        municipio = request.args.get('municipio')
-        from_date = request.args.get('from')
-        to_date = request.args.get('to')
-        year = request.args.get('year', type=int)
+# Con BLOB_PREFIX cada blob <prefijo>YYYY.csv o <prefijo>YYYY-MM.csv es una partición.
+# Solo se descargan y parsean las particiones que toca el rango de fechas de la consulta;
+# cada una se cachea por separado (validada por ETag) y puede desalojarse sola.
+_PARTITION_PATTERN = re.compile(r'(\d{4})(?:-(\d{2}))?\.csv$')
+_PARTITION_LISTING = {'at': 0.0, 'partitions': []}
+_PARTITION_CACHE = {}
+_PARTITION_EXECUTOR = ThreadPoolExecutor(max_workers=PARTITION_LOAD_WORKERS, thread_name_prefix='partition')
 
-        # Filtros
-        if municipio and 'Municipio' in df.columns:
-            df = df[df['Municipio'].str.lower() == municipio.lower()]
-        if from_date and 'Fecha' in df.columns and pd.api.types.is_datetime64_any_dtype(df['Fecha']):
-            df = df[df['Fecha'] >= pd.to_datetime(from_date)]
-        if to_date and 'Fecha' in df.columns and pd.api.types.is_datetime64_any_dtype(df['Fecha']):
-            df = df[df['Fecha'] <= pd.to_datetime(to_date)]
-        # Filtro por año
-        if year and 'Fecha' in df.columns:
-            if not pd.api.types.is_datetime64_any_dtype(df['Fecha']):
-                df['Fecha'] = pd.to_datetime(df['Fecha'], errors='coerce')
-            df = df[df['Fecha'].dt.year == year]
-        # Orden por fecha si existe
-        if 'Fecha' in df.columns and pd.api.types.is_datetime64_any_dtype(df['Fecha']):
-            df = df.sort_values('Fecha')
 
-        # Selección de columnas
-        if columns:
-            cols = [c.strip() for c in columns.split(',') if c.strip() in df.columns]
-            if cols:
-                df = df[cols]
+def list_radianza_partitions():
+    """Lista las particiones bajo BLOB_PREFIX (con TTL): [{name, etag, start, end}] por fecha"""
+    now = time.time()
+    if _PARTITION_LISTING['partitions'] and (now - _PARTITION_LISTING['at']) < _CACHE_TTL_SECONDS:
+        return _PARTITION_LISTING['partitions']
 
-        # Límite
-        if limit is not None and limit > 0:
-            df = df.head(limit)
+    blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
+    container_client = blob_service_client.get_container_client(CONTAINER_NAME)
+    partitions = []
+    for blob in container_client.list_blobs(name_starts_with=BLOB_PREFIX):
+        match = _PARTITION_PATTERN.search(blob.name)
+        if not match:
+            continue
+        year, month = int(match.group(1)), match.group(2)
+        if month:
+            start = pd.Timestamp(year=year, month=int(month), day=1)
+            end = start + pd.offsets.MonthBegin(1)
+        else:
+            start = pd.Timestamp(year=year, month=1, day=1)
+            end = pd.Timestamp(year=year + 1, month=1, day=1)
+        partitions.append({'name': blob.name, 'etag': blob.etag, 'start': start, 'end': end})
+    partitions.sort(key=lambda part: part['start'])
+    _PARTITION_LISTING.update({'at': now, 'partitions': partitions})
+    return partitions
+
+
+def _partitions_version(partitions):
+    """Versión del conjunto de particiones: cambia si se agrega o modifica cualquier blob"""
+    raw = '|'.join(f"{part['name']}:{part['etag']}" for part in partitions)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def _evict_partition(name):
+    _PARTITION_CACHE.pop(name, None)
+
+
+def _load_partition(part):
+    """Descarga y parsea una partición, reutilizando el cache si el ETag no cambió"""
+    cached = _PARTITION_CACHE.get(part['name'])
+    if cached is not None and cached['etag'] == part['etag']:
+        MEMORY_BUDGET.touch('partition', part['name'])
+        return cached['df']
+    data = _download_blob_bytes(part['name'])
+    df = _parse_csv_bytes(data, RADIANZA_SCHEMA, f"radianza:{part['name']}")
+    if 'Municipio' in df.columns:
+        df['Municipio'] = df['Municipio'].astype(str)
+    _PARTITION_CACHE[part['name']] = {'etag': part['etag'], 'df': df}
+    MEMORY_BUDGET.register('partition', part['name'], frame_nbytes(df),
+                           evict=lambda name=part['name']: _evict_partition(name))
+    return df
+
+
+def load_radianza_partitions(partitions, start=None, end=None):
+    """Arma un DataFrame con las particiones que se solapan con [start, end], en paralelo"""
+    selected = [part for part in partitions
+                if (start is None or part['end'] > start) and (end is None or part['start'] <= end)]
+    if not selected:
+        return pd.DataFrame(columns=list(RADIANZA_SCHEMA['dtypes']))
+    frames = list(_PARTITION_EXECUTOR.map(_load_partition, selected))
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def date_bounds(args):
+    """Intersección de from/to/year como (inicio, fin) inclusivos; None si no hay límite"""
+    lower = [pd.to_datetime(args.get('from'))] if args.get('from') else []
+    upper = [pd.to_datetime(args.get('to'))] if args.get('to') else []
+    year = args.get('year', type=int)
+    if year:
+        lower.append(pd.Timestamp(year=year, month=1, day=1))
+        upper.append(pd.Timestamp(year=year + 1, month=1, day=1) - pd.Timedelta(1, 'ns'))
+    return (max(lower) if lower else None), (min(upper) if upper else None)
+
+
+def get_radianza_frame(args, municipio=None):
+    """Datos de radianza para una consulta: solo las particiones del rango si hay layout particionado.
+
+    En modo streaming se escanea el archivo local con los filtros de fecha y municipio.
+    """
+    if STREAMING_MODE:
+        # Filtro por municipio como superconjunto: los endpoints aplican después su filtro exacto
+        names = [m for m in args.getlist('municipios') + [args.get('municipio'), municipio] if m]
+        municipios = names + [part.strip() for name in names for part in name.split(',')]
+        start, end = date_bounds(args)
+        return scan_spill(get_streaming_state(), start, end, municipios)
+    if not BLOB_PREFIX:
+        return get_blob_data()
+    start, end = date_bounds(args)
+    if start is None and end is None:
+        return get_blob_data()
+    if not STORAGE_ACCOUNT_KEY:
+        raise ValueError(
+            "STORAGE_ACCOUNT_KEY no está configurada. "
+            "Por favor, configúrala como variable de entorno."
+        )
+    return load_radianza_partitions(list_radianza_partitions(), start, end)
+
+# ==================== MODO STREAMING (OUT-OF-CORE) ====================
+
+# Con STREAMING_MODE el CSV de radianza nunca se carga completo: se parsea por bloques
+# de STREAM_BLOCK_BYTES, cada bloque actualiza agregados por (municipio, año) y se vuelca
+# a un Parquet en SPILL_DIR. La memoria pico queda acotada por el tamaño de bloque.
+_STREAM_NUMERIC = ['Media_de_radianza', 'Maximo_de_radianza', 'Minimo_de_radianza',
+                   'Suma_de_radianza', 'Cantidad_de_pixeles']
+_STREAMING_STATE = {}
+_STREAMING_LOCK = threading.Lock()
+
+
+class _ChunkReader(io.RawIOBase):
+    """Archivo de solo lectura sobre un iterador de bloques de bytes (hashea al vuelo)"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b'')
+        self.digest = hashlib.sha1()
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self.digest.update(chunk)
+            self.bytes_read += len(chunk)
+            self._buffer = memoryview(chunk)
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def _iter_blob_chunks(blob_name):
+    """Devuelve (etag, iterador de bloques) sin descargar el blob completo a memoria"""
+    blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
+    blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME, blob=blob_name)
+    downloader = blob_client.download_blob()
+    return downloader.properties.etag, downloader.chunks()
+
+
+def _blob_etag(blob_name):
+    blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
+    blob_client = blob_service_client.get_blob_client(container=CONTAINER_NAME, blob=blob_name)
+    return blob_client.get_blob_properties().etag
+
+
+def _combine_partials(acc, part):
+    """Combina agregados parciales (sum/count/min/max por municipio y año)"""
+    if acc is None:
+        return part
+    index = acc.index.union(part.index)
+    acc, part = acc.reindex(index), part.reindex(index)
+    return pd.concat({
+        'sum': acc['sum'].add(part['sum'], fill_value=0),
+        'count': acc['count'].add(part['count'], fill_value=0),
+        'min': np.fmin(acc['min'], part['min']),
+        'max': np.fmax(acc['max'], part['max']),
+    }, axis=1)
+
+
+def ingest_radianza_streaming():
+    """Lee el blob por bloques: agrega de forma incremental y vuelca las filas a Parquet"""
+    started = time.perf_counter()
+    etag, chunks = _iter_blob_chunks(BLOB_NAME)
+    source = _ChunkReader(chunks)
+    reader = pa_csv.open_csv(
+        io.BufferedReader(source, buffer_size=1024 * 1024),
+        read_options=pa_csv.ReadOptions(block_size=STREAM_BLOCK_BYTES),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={col: pa.type_for_alias(alias) for col, alias in RADIANZA_SCHEMA['dtypes'].items()},
+            timestamp_parsers=RADIANZA_SCHEMA['date_formats'] + [pa_csv.ISO8601],
+            strings_can_be_null=True,
+        ),
+    )
+    os.makedirs(SPILL_DIR, exist_ok=True)
+    tmp_path = os.path.join(SPILL_DIR, f'radianza-{uuid.uuid4().hex}.parquet.tmp')
+    acc = None
+    rows = 0
+    with pq.ParquetWriter(tmp_path, reader.schema, compression=_PARQUET_COMPRESSION) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+            rows += batch.num_rows
+            chunk = batch.to_pandas()
+            numeric = [col for col in _STREAM_NUMERIC if col in chunk.columns]
+            keys = [chunk['Municipio'].astype(str), chunk['Fecha'].dt.year.rename('year')]
+            grouped = chunk.groupby(keys)[numeric]
+            acc = _combine_partials(acc, pd.concat({
+                'sum': grouped.sum(), 'count': grouped.count(), 'min': grouped.min(), 'max': grouped.max()
+            }, axis=1))
+
+    version = source.digest.hexdigest()[:16]
+    spill_path = os.path.join(SPILL_DIR, f'radianza-{version}.parquet')
+    os.replace(tmp_path, spill_path)
+    for old_path in glob.glob(os.path.join(SPILL_DIR, 'radianza-*.parquet')):
+        if old_path != spill_path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    metadata = pq.ParquetFile(spill_path).metadata
+    date_stats = [metadata.row_group(i).column(reader.schema.get_field_index('Fecha')).statistics
+                  for i in range(metadata.num_row_groups)]
+    by_municipio_year = acc if acc is not None else pd.DataFrame()
+    state = {
+        'version': version,
+        'etag': etag,
+        'loaded_at': time.time(),
+        'spill_path': spill_path,
+        'rows': rows,
+        'by_municipio_year': by_municipio_year,
+        'fecha_min': min((st.min for st in date_stats if st is not None and st.has_min_max), default=None),
+        'fecha_max': max((st.max for st in date_stats if st is not None and st.has_min_max), default=None),
+    }
+    elapsed = time.perf_counter() - started
+    _INGEST_STATS['radianza'] = {
+        'engine': 'pyarrow-streaming',
+        'bytes': source.bytes_read,
+        'rows': rows,
+        'parse_seconds': round(elapsed, 4),
+        'throughput_mb_s': round(source.bytes_read / (1024 * 1024) / elapsed, 2) if elapsed > 0 else 0.0,
+        'spill_bytes': os.path.getsize(spill_path),
+    }
+    MEMORY_BUDGET.register('snapshot', 'radianza:aggregates', frame_nbytes(by_municipio_year))
+    print(f"Ingesta streaming radianza: {rows} filas, {source.bytes_read / 1024 / 1024:.2f} MB "
+          f"en {elapsed:.3f}s -> {spill_path}")
+    return state
+
+
+def get_streaming_state():
+    """Agregados y archivo local vigentes; se reingesta solo si el ETag del blob cambió"""
+    if not STORAGE_ACCOUNT_KEY:
+        raise ValueError(
+            "STORAGE_ACCOUNT_KEY no está configurada. "
+            "Por favor, configúrala como variable de entorno."
+        )
+    with _STREAMING_LOCK:
+        state = _STREAMING_STATE.get('radianza')
+        now = time.time()
+        if state is not None and (now - state['loaded_at']) < _CACHE_TTL_SECONDS:
+            return state
+        if state is not None and os.path.exists(state['spill_path']) and _blob_etag(BLOB_NAME) == state['etag']:
+            state['loaded_at'] = now
+            return state
+        state = ingest_radianza_streaming()
+        _STREAMING_STATE['radianza'] = state
+        _SNAPSHOT_VERSIONS['radianza'] = state['version']
+        return state
+
+
+def scan_spill(state, start=None, end=None, municipios=None):
+    """Lee del Parquet local solo los row groups y filas que cumplen fecha/municipio"""
+    parquet_file = pq.ParquetFile(state['spill_path'])
+    fecha_index = parquet_file.schema_arrow.get_field_index('Fecha')
+    wanted = pa.array(sorted({m.lower() for m in municipios}), type=pa.string()) if municipios else None
+    start_scalar = pa.scalar(start.as_unit('ns').value, type=pa.timestamp('ns')) if start is not None else None
+    end_scalar = pa.scalar(end.as_unit('ns').value, type=pa.timestamp('ns')) if end is not None else None
+
+    tables = []
+    for i in range(parquet_file.metadata.num_row_groups):
+        stats = parquet_file.metadata.row_group(i).column(fecha_index).statistics
+        if stats is not None and stats.has_min_max:
+            # Se salta el row group completo si su rango de fechas no se solapa
+            if start is not None and pd.Timestamp(stats.max) < start:
+                continue
+            if end is not None and pd.Timestamp(stats.min) > end:
+                continue
+        table = parquet_file.read_row_group(i)
+        mask = None
+        if start is not None:
+            mask = pc.greater_equal(table['Fecha'], start_scalar)
+        if end is not None:
+            cond = pc.less_equal(table['Fecha'], end_scalar)
+            mask = cond if mask is None else pc.and_(mask, cond)
+        if wanted is not None:
+            cond = pc.is_in(pc.utf8_lower(table['Municipio']), value_set=wanted)
+            mask = cond if mask is None else pc.and_(mask, cond)
+        tables.append(table.filter(mask) if mask is not None else table)
+
+    if not tables:
+        return parquet_file.schema_arrow.empty_table().to_pandas()
+    df = pa.concat_tables(tables).to_pandas()
+    if 'Municipio' in df.columns:
+        df['Municipio'] = df['Municipio'].astype(str)
+    return df
+
+
+def spill_summary(state):
+    """Columnas, tamaño, tipos y nulos del spill leyendo solo metadatos y el primer row group"""
+    parquet_file = pq.ParquetFile(state['spill_path'])
+    metadata = parquet_file.metadata
+    schema = parquet_file.schema_arrow
+    null_counts = dict.fromkeys(schema.names, 0)
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        for j in range(row_group.num_columns):
+            stats = row_group.column(j).statistics
+            if stats is not None and stats.has_null_count:
+                null_counts[schema.names[j]] += stats.null_count
+    sample = (parquet_file.read_row_group(0).slice(0, 3).to_pandas().to_dict('records')
+              if metadata.num_row_groups else [])
+    return {
+        'columns': schema.names,
+        'shape': (metadata.num_rows, len(schema.names)),
+        'dtypes': {col: str(dtype) for col, dtype in schema.empty_table().to_pandas().dtypes.items()},
+        'sample_data': sample,
+        'null_counts': null_counts,
+    }
+
+
+def streaming_stats_payload(state):
+    """Respuesta de /api/stats calculada solo con los agregados incrementales"""
+    acc = state['by_municipio_year']
+    per_municipio = acc.groupby(level=0).agg({
+        **{('sum', col): 'sum' for col in acc['sum'].columns},
+        **{('count', col): 'sum' for col in acc['count'].columns},
+        **{('min', col): 'min' for col in acc['min'].columns},
+        **{('max', col): 'max' for col in acc['max'].columns},
+    })
+    stats = pd.DataFrame({
+        'Media_de_radianza_mean': per_municipio[('sum', 'Media_de_radianza')] / per_municipio[('count', 'Media_de_radianza')],
+        'Media_de_radianza_max': per_municipio[('max', 'Media_de_radianza')],
+        'Media_de_radianza_min': per_municipio[('min', 'Media_de_radianza')],
+    })
+    for col in ('Suma_de_radianza', 'Cantidad_de_pixeles'):
+        if col in acc['sum'].columns:
+            stats[f'{col}_sum'] = per_municipio[('sum', col)]
+    stats = stats.round(2)
+    by_municipio = {
+        str(municipio): {col: (None if pd.isna(value) else float(value)) for col, value in row.items()}
+        for municipio, row in stats.iterrows()
+    }
+    totals = acc.sum()
+    general = {
+        'total_records': state['rows'],
+        'total_municipios': int(len(per_municipio)),
+        'fecha_min': str(pd.Timestamp(state['fecha_min'])) if state['fecha_min'] is not None else 'N/A',
+        'fecha_max': str(pd.Timestamp(state['fecha_max'])) if state['fecha_max'] is not None else 'N/A',
+        'radianza_promedio': float(totals[('sum', 'Media_de_radianza')] / totals[('count', 'Media_de_radianza')]),
+        'radianza_maxima': float(acc[('max', 'Maximo_de_radianza')].max()),
+        'radianza_minima': float(acc[('min', 'Minimo_de_radianza')].min()),
+    }
+    return {'success': True, 'general': general, 'by_municipio': by_municipio}
+
+
+def streaming_comparison(state, metric, top_n, year=None):
+    """Ranking por promedio usando sumas y conteos por (municipio, año)"""
+    acc = state['by_municipio_year']
+    if metric not in acc['sum'].columns:
+        raise ValueError('Campos requeridos no existen')
+    if year:
+        acc = acc[acc.index.get_level_values('year') == year]
+    sums = acc[('sum', metric)].groupby(level=0).sum()
+    counts = acc[('count', metric)].groupby(level=0).sum()
+    agg = (
+        (sums / counts.where(counts > 0)).rename('promedio').rename_axis('Municipio').reset_index()
+        .sort_values('promedio', ascending=False)
+        .head(top_n)
+    )
+    agg['Municipio'] = agg['Municipio'].astype(str)
+    agg['promedio'] = agg['promedio'].astype(float).round(2)
+    return agg.to_dict('records')
+
+# Descripción lógica de cada dataset para los endpoints genéricos
+DATASETS = {
+    'radianza': {
+        'loader': get_blob_data,
+        # Carga acotada por from/to/year (solo particiones necesarias)
+        'range_loader': get_radianza_frame,
+        'date': 'Fecha',
+        'municipio': 'Municipio',
+        'entidad': None,
+        'metric': 'Media_de_radianza',
+    },
+    'pib': {
+        'loader': get_pib_data,
+        'date': 'fecha',
+        'municipio': 'municipio',
+        'entidad': 'entidad_federativa',
+        'metric': 'pib_mun',
+    },
+}
+
+
+def _get_dataset(name):
+    """Devuelve la descripción del dataset o lanza ValueError si no existe"""
+    spec = DATASETS.get((name or 'radianza').lower())
+    if spec is None:
+        raise ValueError(f"Dataset no válido: {name}. Opciones: {', '.join(DATASETS)}")
+    return spec
+
+
+def get_snapshot_version(dataset):
+    """Versión del snapshot vigente del dataset (lo carga si hace falta).
+
+    En modo streaming sale del estado de ingesta y con layout particionado del listado
+    de particiones, sin leer filas.
+    """
+    spec = _get_dataset(dataset)
+    if dataset == 'radianza' and STREAMING_MODE:
+        _SNAPSHOT_VERSIONS[dataset] = get_streaming_state()['version']
+        return _SNAPSHOT_VERSIONS[dataset]
+    if dataset == 'radianza' and BLOB_PREFIX:
+        _SNAPSHOT_VERSIONS[dataset] = _partitions_version(list_radianza_partitions())
+        return _SNAPSHOT_VERSIONS[dataset]
+    spec['loader']()
+    return _SNAPSHOT_VERSIONS.get(dataset)
+
+# Formatos binarios negociables en los endpoints de datos (JSON sigue siendo el default)
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+MSGPACK_MIMETYPE = 'application/msgpack'
+_FORMAT_ALIASES = {
+    'json': 'json',
+    'arrow': 'arrow',
+    'msgpack': 'msgpack',
+    'application/json': 'json',
+    ARROW_MIMETYPE: 'arrow',
+    MSGPACK_MIMETYPE: 'msgpack',
+    'application/x-msgpack': 'msgpack',
+}
+
+
+def _negotiate_format():
+    """Elige el formato de respuesta a partir de ?format= o del header Accept"""
+    fmt = request.args.get('format')
+    if fmt:
+        if fmt.lower() not in _FORMAT_ALIASES:
+            raise ValueError(f"Formato no válido: {fmt}. Opciones: json, arrow, msgpack")
+        return _FORMAT_ALIASES[fmt.lower()]
+    best = request.accept_mimetypes.best_match(
+        ['application/json', ARROW_MIMETYPE, MSGPACK_MIMETYPE, 'application/x-msgpack'],
+        default='application/json'
+    )
+    return _FORMAT_ALIASES[best]
+
+
+def _arrow_response(df):
+    """Serializa el DataFrame como stream Arrow IPC conservando tipos y nulos"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(sink.getvalue().to_pybytes(), mimetype=ARROW_MIMETYPE,
+                    headers={'X-Total-Records': str(len(df))})
+
+
+def _msgpack_column(series):
+    """Convierte una columna a lista nativa; nulos -> nil, fechas -> Timestamp ext"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        nanos = series.values.astype('datetime64[ns]').astype('int64')
+        nulls = series.isna().values
+        return [None if null else msgpack.Timestamp.from_unix_nano(int(v))
+                for v, null in zip(nanos, nulls)]
+    if pd.api.types.is_float_dtype(series) and series.isna().any():
+        return series.astype(object).where(series.notna(), None).tolist()
+    if series.dtype == object:
+        return series.where(series.notna(), None).tolist()
+    return series.tolist()
+
+
+def _msgpack_response(df):
+    """Serializa el DataFrame en MessagePack con layout columnar"""
+    body = {
+        'columns': list(df.columns),
+        'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
+        'data': {col: _msgpack_column(df[col]) for col in df.columns},
+        'total_records': len(df),
+    }
+    return Response(msgpack.packb(body, datetime=False), mimetype=MSGPACK_MIMETYPE,
+                    headers={'X-Total-Records': str(len(df))})
+
+
+def _binary_response(df, fmt):
+    """Respuesta Arrow o MessagePack para un DataFrame ya filtrado"""
+    if fmt == 'arrow':
+        return _arrow_response(df)
+    return _msgpack_response(df)
+
+# Exportación a Parquet: grupos de filas comprimidos escritos de forma incremental
+_PARQUET_ROW_GROUP_ROWS = 64_000
+_PARQUET_COMPRESSION = 'zstd'
+
+# Tamaño y tiempo de las exportaciones por dataset y formato (se exponen en /api/debug)
+_EXPORT_STATS = {}
+
+
+def _drain(sink):
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def iter_parquet_row_groups(df):
+    """Escribe el DataFrame como Parquet por porciones: cada row group se convierte desde
+    su porción del DataFrame y sus bytes se entregan en cuanto el writer los emite"""
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    sink = BytesIO()
+    with pq.ParquetWriter(sink, schema, compression=_PARQUET_COMPRESSION) as writer:
+        for start in range(0, len(df), _PARQUET_ROW_GROUP_ROWS):
+            part = df.iloc[start:start + _PARQUET_ROW_GROUP_ROWS]
+            writer.write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False))
+            chunk = _drain(sink)
+            if chunk:
+                yield chunk
+    # Al cerrar el writer queda el footer con los metadatos de todos los row groups
+    chunk = _drain(sink)
+    if chunk:
+        yield chunk
+
+
+def _record_export(dataset, fmt, nbytes, seconds, rows):
+    """Acumula métricas de exportación para comparar CSV contra Parquet"""
+    stats = _EXPORT_STATS.setdefault(dataset, {}).setdefault(fmt, {
+        'exports': 0, 'rows': 0, 'bytes': 0, 'seconds': 0.0
+    })
+    stats['exports'] += 1
+    stats['rows'] += rows
+    stats['bytes'] += nbytes
+    stats['seconds'] = round(stats['seconds'] + seconds, 4)
+    stats['bytes_per_row'] = round(stats['bytes'] / stats['rows'], 2) if stats['rows'] else 0.0
+    print(f"Export {dataset}/{fmt}: {rows} filas, {nbytes / 1024:.1f} KB en {seconds:.3f}s")
+
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8-sig',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def render_export(df, dataset, export_format, started):
+    """Serializa un export ya filtrado como iterador de bloques de bytes.
+
+    CSV sale en un solo bloque; Parquet en un bloque por row group, sin tener el
+    archivo completo en memoria. Las métricas se registran al consumir el último bloque.
+    """
+    if export_format == 'parquet':
+        # Parquet conserva los tipos originales (fechas, numéricos y nulos)
+        chunks = iter_parquet_row_groups(df)
+    else:
+        df = df.copy()
+        # Convertir fechas a string formato legible
+        for col in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = df[col].dt.strftime('%Y-%m-%d')
         
-        # Convertir DataFrame a formato JSON
-        # Manejar NaN y valores infinitos
-        df = df.replace([float('inf'), float('-inf')], None)
+        # Reemplazar NaN y valores infinitos
+        df = df.replace([float('inf'), float('-inf')], '')
         df = df.fillna('')
         
-        # Convertir fechas a string para JSON
-        if 'Fecha' in df.columns and pd.api.types.is_datetime64_any_dtype(df['Fecha']):
-            df['Fecha'] = df['Fecha'].dt.strftime('%Y-%m-%d')
-        
-        data = df.to_dict('records')
-        
-        return jsonify({
-            'success': True,
-            'data': data,
-            'total_records': len(data)
+        # Convertir DataFrame a CSV
+        output = StringIO()
+        df.to_csv(output, index=False, encoding='utf-8-sig')  # utf-8-sig para Excel
+        chunks = [output.getvalue().encode('utf-8')]
+    return _recorded_export(chunks, dataset, export_format, started, len(df))
+
+
+def _recorded_export(chunks, dataset, export_format, started, rows):
+    nbytes = 0
+    for chunk in chunks:
+        nbytes += len(chunk)
+        yield chunk
+    _record_export(dataset, export_format, nbytes, time.perf_counter() - started, rows)
+
+
+# Parquet se arma en un archivo temporal: en memoria hasta este tamaño y en disco después
+_EXPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+def _iter_spool(spool, block_size=64 * 1024):
+    try:
+        while True:
+            block = spool.read(block_size)
+            if not block:
+                break
+            yield block
+    finally:
+        spool.close()
+
+
+def _export_response(chunks, filename, export_format, started):
+    """Respuesta de descarga con headers de adjunto y métricas de la exportación.
+
+    CSV se responde completo; Parquet se escribe por row groups a un archivo temporal
+    dentro de la petición y se envía por bloques, ambos con su tamaño y duración.
+    """
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}.{export_format}"',
+        'Content-Type': EXPORT_FORMATS[export_format],
+    }
+    if export_format == 'parquet':
+        spool = tempfile.SpooledTemporaryFile(max_size=_EXPORT_SPOOL_BYTES)
+        for chunk in chunks:
+            spool.write(chunk)
+        headers['X-Export-Bytes'] = str(spool.tell())
+        headers['X-Export-Seconds'] = f'{time.perf_counter() - started:.4f}'
+        headers['Content-Length'] = headers['X-Export-Bytes']
+        spool.seek(0)
+        response = Response(_iter_spool(spool), mimetype=EXPORT_FORMATS[export_format], headers=headers)
+        # Si el cliente corta la descarga el generador no termina: se cierra aquí
+        response.call_on_close(spool.close)
+        return response
+    body = b''.join(chunks)
+    headers['X-Export-Bytes'] = str(len(body))
+    headers['X-Export-Seconds'] = f'{time.perf_counter() - started:.4f}'
+    return Response(body, mimetype=EXPORT_FORMATS[export_format].split(';')[0], headers=headers)
+
+# ==================== PAGINACIÓN POR CURSOR ====================
+
+# Vista ordenada por (fecha, municipio) de cada snapshot, con índices de posiciones
+_SORTED_VIEWS = {}
+_DEFAULT_PAGE_SIZE = 1000
+_MAX_PAGE_SIZE = 10000
+
+
+class StaleCursorError(ValueError):
+    """El cursor pertenece a un snapshot que ya fue reemplazado"""
+
+
+def get_sorted_view(dataset):
+    """Snapshot ordenado por (fecha, municipio) más índices para búsquedas por posición.
+
+    Se construye una vez por versión del snapshot; las páginas se resuelven con
+    búsqueda binaria sobre este orden en vez de filtrar y recortar desde el inicio.
+    """
+    spec = _get_dataset(dataset)
+    if dataset == 'radianza' and STREAMING_MODE:
+        raise ValueError('La paginación por cursor no está disponible en modo streaming: '
+                         'requiere ordenar el snapshot completo; filtra por fecha o municipio en /api/data')
+    version = get_snapshot_version(dataset)
+    view = _SORTED_VIEWS.get(dataset)
+    if view is not None and view['version'] == version:
+        MEMORY_BUDGET.touch('index', f'sorted:{dataset}')
+        return view
+    df = spec['loader']()
+    version = _SNAPSHOT_VERSIONS.get(dataset)
+
+    date_col, mun_col, ent_col = spec['date'], spec['municipio'], spec['entidad']
+    sorted_df = df.sort_values([date_col, mun_col], kind='mergesort', na_position='last').reset_index(drop=True)
+    view = {
+        'version': version,
+        'df': sorted_df,
+        'dates': sorted_df[date_col].values.astype('datetime64[ns]'),
+        # Posiciones (ascendentes) de cada municipio / entidad dentro del orden global
+        'by_municipio': sorted_df.groupby(sorted_df[mun_col].str.lower(), sort=False).indices,
+        'by_entidad': (sorted_df.groupby(sorted_df[ent_col].str.lower(), sort=False).indices
+                       if ent_col and ent_col in sorted_df.columns else {}),
+    }
+    _SORTED_VIEWS[dataset] = view
+    index_bytes = sum(positions.nbytes for key in ('by_municipio', 'by_entidad')
+                      for positions in view[key].values())
+    MEMORY_BUDGET.register('index', f'sorted:{dataset}',
+                           frame_nbytes(sorted_df, deep=False) + view['dates'].nbytes + index_bytes,
+                           evict=lambda: _SORTED_VIEWS.pop(dataset, None))
+    return view
+
+
+def _encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        return int(payload['p']), payload['v'], payload['f']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Cursor inválido')
+
+
+def _page_filter_key(args):
+    """Huella de los filtros: un cursor solo es válido con los mismos filtros"""
+    items = sorted((k, v) for k, values in args.lists()
+                   if k in ('municipio', 'entidad', 'from', 'to', 'year') for v in values)
+    return hashlib.sha1(repr(items).encode('utf-8')).hexdigest()[:12]
+
+
+def paginate(dataset, args):
+    """Devuelve (página, cursor siguiente, versión) buscando por posición en la vista ordenada"""
+    view = get_sorted_view(dataset)
+    page_size = min(max(args.get('page_size', default=_DEFAULT_PAGE_SIZE, type=int) or _DEFAULT_PAGE_SIZE, 1),
+                    _MAX_PAGE_SIZE)
+    filter_key = _page_filter_key(args)
+
+    start = 0
+    cursor = args.get('cursor')
+    if cursor:
+        start, version, cursor_filters = _decode_cursor(cursor)
+        if version != view['version']:
+            raise StaleCursorError('Los datos cambiaron desde que se emitió el cursor; vuelve a empezar')
+        if cursor_filters != filter_key:
+            raise ValueError('El cursor no corresponde a los filtros de la consulta')
+
+    # Candidatos: posiciones ordenadas que cumplen municipio/entidad (None = todas)
+    candidates = None
+    municipio = args.get('municipio')
+    if municipio:
+        candidates = view['by_municipio'].get(municipio.lower(), np.empty(0, dtype=np.intp))
+    entidad = args.get('entidad')
+    if entidad:
+        if not _get_dataset(dataset)['entidad']:
+            raise ValueError('El dataset no tiene columna de entidad federativa')
+        ent_positions = view['by_entidad'].get(entidad.lower(), np.empty(0, dtype=np.intp))
+        candidates = ent_positions if candidates is None else np.intersect1d(candidates, ent_positions)
+
+    # Rango de fechas -> rango de posiciones por búsqueda binaria
+    dates = view['dates']
+    lo, hi = 0, len(dates)
+    start_date, end_date = date_bounds(args)
+    if start_date is not None:
+        lo = int(np.searchsorted(dates, np.datetime64(start_date, 'ns'), side='left'))
+    if end_date is not None:
+        hi = int(np.searchsorted(dates, np.datetime64(end_date, 'ns'), side='right'))
+    start = max(start, lo)
+
+    if candidates is None:
+        positions = np.arange(start, max(min(start + page_size, hi), start))
+        more = start + page_size < hi
+    else:
+        begin = int(np.searchsorted(candidates, start, side='left'))
+        end = int(np.searchsorted(candidates, hi, side='left'))
+        positions = candidates[begin:min(begin + page_size, end)]
+        more = begin + page_size < end
+
+    page = view['df'].iloc[positions]
+    next_cursor = None
+    if more and len(positions):
+        spec = _get_dataset(dataset)
+        last = page.iloc[-1]
+        next_cursor = _encode_cursor({
+            'v': view['version'],
+            'p': int(positions[-1]) + 1,
+            'f': filter_key,
+            # Clave (fecha, municipio) de la última fila, informativa para depuración
+            'k': [str(last[spec['date']])[:10], str(last[spec['municipio']])],
         })
+    return page, next_cursor, view['version']
+
+
+def _page_response(dataset, fmt, args):
+    """Serializa una página en el formato negociado, con el cursor siguiente"""
+    try:
+        df, next_cursor, version = paginate(dataset, args)
+    except StaleCursorError as e:
+        return jsonify({'success': False, 'error': str(e)}), 410
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    columns = args.get('columns')
+    if columns:
+        cols = [c.strip() for c in columns.split(',') if c.strip() in df.columns]
+        if cols:
+            df = df[cols]
+
+    if fmt != 'json':
+        response = _binary_response(df, fmt)
+        response.headers['X-Snapshot-Version'] = version or ''
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+
+    df = df.replace([float('inf'), float('-inf')], None)
+    df = df.fillna('')
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime('%Y-%m-%d')
+    data = df.to_dict('records')
+    return jsonify({
+        'success': True,
+        'data': data,
+        'total_records': len(data),
+        'next': next_cursor,
+        'snapshot_version': version
+    })
+
+# ==================== BÚSQUEDA DE MUNICIPIOS ====================
+
+# Índice de nombres por dataset, reconstruido solo cuando cambia la versión del snapshot
+_SEARCH_INDEXES = {}
+_DEFAULT_SEARCH_LIMIT = 10
+_MAX_SEARCH_LIMIT = 100
+
+
+def normalize_name(value):
+    """Minúsculas y sin acentos, para comparar 'Tláhuac' con 'tlahuac'"""
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold().strip()
+
+
+def _municipio_pairs(dataset, source):
+    """Pares únicos (municipio, entidad) del snapshot (DataFrame, estado streaming o
+    lista de particiones, que se recorren una a una sin concatenarlas)"""
+    if isinstance(source, list):
+        return sorted({pair for part in source for pair in _municipio_pairs(dataset, _load_partition(part))})
+    if isinstance(source, dict):
+        names = source['by_municipio_year'].index.get_level_values(0).unique()
+        return [(str(m), None) for m in names if m]
+
+    spec = DATASETS[dataset]
+    mun_col, ent_col = spec['municipio'], spec['entidad']
+    cols = [mun_col] + ([ent_col] if ent_col and ent_col in source.columns else [])
+    unique = source[cols].dropna(subset=[mun_col]).drop_duplicates()
+    municipios = unique[mun_col].astype(str).tolist()
+    entidades = unique[ent_col].astype(str).tolist() if len(cols) > 1 else [None] * len(municipios)
+    return [(m, e) for m, e in zip(municipios, entidades) if m]
+
+
+def get_search_index(dataset):
+    """Índice de búsqueda de municipios del dataset.
+
+    Guarda los nombres normalizados ordenados (prefijos por búsqueda binaria) y
+    concatenados en un solo texto (subcadenas con str.find, sin recorrer en Python).
+    """
+    dataset = (dataset or 'radianza').lower()
+    spec = _get_dataset(dataset)
+    if dataset == 'radianza' and STREAMING_MODE:
+        source = get_streaming_state()
+        version = source['version']
+    elif dataset == 'radianza' and BLOB_PREFIX:
+        source = list_radianza_partitions()
+        version = _partitions_version(source)
+    else:
+        source = spec['loader']()
+        version = _SNAPSHOT_VERSIONS.get(dataset)
+    index = _SEARCH_INDEXES.get(dataset)
+    if index is not None and index['version'] == version:
+        MEMORY_BUDGET.touch('index', f'search:{dataset}')
+        return index
+
+    pairs = _municipio_pairs(dataset, source)
+    entries = sorted({(normalize_name(m), m, e) for m, e in pairs})
+    keys = [key for key, _, _ in entries]
+    offsets, position = [], 0
+    for key in keys:
+        offsets.append(position)
+        position += len(key) + 1
+    index = {
+        'version': version,
+        'keys': keys,
+        'names': [m for _, m, _ in entries],
+        'entidades': [e for _, _, e in entries],
+        'entidad_keys': [normalize_name(e) if e is not None else None for _, _, e in entries],
+        # Nombres separados por '\n' para que una subcadena nunca cruce dos municipios
+        'text': '\n'.join(keys),
+        'offsets': offsets,
+        'municipios': sorted({m for _, m, _ in entries}),
+    }
+    _SEARCH_INDEXES[dataset] = index
+    index_bytes = sum(len(key) * 2 + len(name) * 2 for key, name in zip(keys, index['names'])) + len(index['text'])
+    MEMORY_BUDGET.register('index', f'search:{dataset}', index_bytes,
+                           evict=lambda: _SEARCH_INDEXES.pop(dataset, None))
+    return index
+
+
+def search_municipios(dataset, query, entidad=None, limit=_DEFAULT_SEARCH_LIMIT):
+    """Top `limit` municipios que contienen `query`: primero los que empiezan por ella,
+    luego los que la tienen al inicio de una palabra y al final cualquier otra coincidencia"""
+    index = get_search_index(dataset)
+    needle = normalize_name(query)
+    entidad_key = normalize_name(entidad) if entidad else None
+    keys = index['keys']
+
+    def wanted(i):
+        return entidad_key is None or index['entidad_keys'][i] == entidad_key
+
+    prefix = []
+    lo = bisect.bisect_left(keys, needle)
+    hi = bisect.bisect_left(keys, needle + '\uffff')
+    for i in range(lo, hi):
+        if wanted(i):
+            prefix.append(i)
+            if len(prefix) >= limit:
+                break
+
+    word, other = [], []
+    if needle and len(prefix) < limit:
+        text, offsets = index['text'], index['offsets']
+        seen = set(range(lo, hi))
+        found = text.find(needle)
+        while found != -1:
+            i = bisect.bisect_right(offsets, found) - 1
+            if i not in seen and wanted(i):
+                seen.add(i)
+                at_word_start = found == offsets[i] or not text[found - 1].isalnum()
+                (word if at_word_start else other).append(i)
+                if len(word) >= limit - len(prefix):
+                    break
+            # Siguiente municipio: las demás apariciones en este nombre no cambian el orden
+            next_start = offsets[i] + len(keys[i]) + 1
+            found = text.find(needle, next_start)
+
+    ranked = (prefix + word + other)[:limit]
+    return [
+        {'municipio': index['names'][i], 'entidad_federativa': index['entidades'][i]}
+        if index['entidades'][i] is not None else {'municipio': index['names'][i]}
+        for i in ranked
+    ], index['version']
+
+
+def _search_response(dataset):
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', default=_DEFAULT_SEARCH_LIMIT, type=int) or _DEFAULT_SEARCH_LIMIT, 1),
+                _MAX_SEARCH_LIMIT)
+    entidad = None
+    if DATASETS[dataset]['entidad']:
+        entidad = request.args.get('entidad_federativa') or request.args.get('entidad')
+    matches, version = search_municipios(dataset, query, entidad=entidad, limit=limit)
+    return jsonify({
+        'success': True,
+        'query': query,
+        'matches': matches,
+        'total_matches': len(matches),
+        'snapshot_version': version
+    })
+
+# ==================== FEED DE CAMBIOS ====================
+
+# Huellas de las últimas versiones de cada snapshot: hash por fila completa y por clave
+# (municipio, fecha[, entidad]). Con ellas se responde "qué cambió desde la versión X".
+_CHANGE_HISTORY = {}
+_CHANGE_DIFFS = {}
+_CHANGE_LOCK = threading.Lock()
+
+
+class StaleVersionError(ValueError):
+    """La versión pedida ya no está en el historial de huellas"""
+
+
+def _change_key_columns(df, spec):
+    cols = [spec['municipio'], spec['date']]
+    if spec['entidad'] and spec['entidad'] in df.columns:
+        cols.append(spec['entidad'])
+    return cols
+
+
+def _register_change_history(dataset, history):
+    history_bytes = sum(array.nbytes for e in history.values()
+                        for name, array in e.items() if name != 'recorded_at')
+    MEMORY_BUDGET.register('index', f'changes:{dataset}', history_bytes,
+                           evict=lambda: _CHANGE_HISTORY.pop(dataset, None))
+
+
+def record_snapshot_history(dataset, df):
+    """Guarda las huellas de la versión recién cargada (una vez por versión).
+
+    Si la versión ya estaba en el historial (p. ej. una vuelta atrás A→B→A) se reutilizan
+    sus huellas y solo se recalculan los hashes alineados con las filas de `df`.
+    """
+    version = _SNAPSHOT_VERSIONS.get(dataset)
+    with _CHANGE_LOCK:
+        history = _CHANGE_HISTORY.setdefault(dataset, OrderedDict())
+        entry = history.get(version)
+        if entry is not None and 'aligned' in entry:
+            history.move_to_end(version)
+            return entry
+        spec = DATASETS[dataset]
+        row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        # Solo la versión vigente conserva los hashes alineados con las filas del snapshot
+        for other in history.values():
+            other.pop('aligned', None)
+        if entry is not None:
+            entry['aligned'] = row_hashes
+            history.move_to_end(version)
+        else:
+            key_hashes = pd.util.hash_pandas_object(df[_change_key_columns(df, spec)], index=False).to_numpy()
+            entry = {
+                'aligned': row_hashes,
+                'row_hashes': np.unique(row_hashes),
+                'key_hashes': np.unique(key_hashes),
+                'recorded_at': time.time(),
+            }
+            history[version] = entry
+            while len(history) > CHANGES_HISTORY_VERSIONS:
+                history.popitem(last=False)
+        _CHANGE_DIFFS.clear()
+        _register_change_history(dataset, history)
+        return entry
+
+
+def _empty_snapshot_frame(dataset):
+    """Frame vacío con las columnas y tipos del snapshot, sin cargarlo completo"""
+    if dataset == 'radianza' and STREAMING_MODE:
+        return pq.ParquetFile(get_streaming_state()['spill_path']).schema_arrow.empty_table().to_pandas()
+    if dataset == 'radianza' and BLOB_PREFIX:
+        partitions = list_radianza_partitions()
+        return _load_partition(partitions[-1]).iloc[0:0] if partitions else load_radianza_partitions([])
+    return _get_dataset(dataset)['loader']().iloc[0:0]
+
+
+def changes_since_version(dataset, since_version):
+    """Filas agregadas o modificadas desde since_version y si el cliente debe reemplazar todo.
+
+    La versión y el historial se consultan antes de cargar filas: el snapshot solo se lee
+    cuando de verdad hay que calcular (o devolver) una diferencia.
+    """
+    spec = _get_dataset(dataset)
+    version = get_snapshot_version(dataset)
+    if since_version == version:
+        return _empty_snapshot_frame(dataset), version, False
+
+    history = _CHANGE_HISTORY.get(dataset, {})
+    old = history.get(since_version)
+    if old is None or (STREAMING_MODE and dataset == 'radianza'):
+        raise StaleVersionError(
+            'La versión no está en el historial de cambios; usa since=<última fecha> o vuelve a cargar todo'
+        )
+    df = spec['loader']()
+    version = _SNAPSHOT_VERSIONS.get(dataset)
+    current = history.get(version)
+    if current is None or 'aligned' not in current:
+        current = record_snapshot_history(dataset, df)
+
+    key = (dataset, since_version, version)
+    cached = _CHANGE_DIFFS.get(key)
+    if cached is None:
+        # Claves que desaparecieron: no hay forma incremental de expresarlo, se pide reemplazo
+        removed = ~np.isin(old['key_hashes'], current['key_hashes'], assume_unique=True)
+        if removed.any():
+            cached = (None, True)
+        else:
+            positions = np.flatnonzero(~np.isin(current['aligned'], old['row_hashes']))
+            cached = (positions, False)
+        _CHANGE_DIFFS[key] = cached
+    positions, reset = cached
+    changed = df if reset else df.iloc[positions]
+    return changed.sort_values([spec['date'], spec['municipio']], kind='mergesort'), version, reset
+
+
+def changes_since_date(dataset, since):
+    """Filas con fecha estrictamente posterior a la última fecha que vio el cliente"""
+    spec = _get_dataset(dataset)
+    since_ts = pd.Timestamp(since)
+    if dataset == 'radianza' and (STREAMING_MODE or BLOB_PREFIX):
+        # Solo las particiones / row groups desde esa fecha
+        df = spec['range_loader'](MultiDict({'from': since_ts.strftime('%Y-%m-%d')}))
+        df = df[df[spec['date']] > since_ts].sort_values([spec['date'], spec['municipio']], kind='mergesort')
+        if STREAMING_MODE:
+            return df, get_streaming_state()['version']
+        return df, _partitions_version(list_radianza_partitions())
+    view = get_sorted_view(dataset)
+    start = int(np.searchsorted(view['dates'], since_ts.to_datetime64(), side='right'))
+    return view['df'].iloc[start:], view['version']
+
+
+def _changes_payload(df, fmt, version, reset):
+    if fmt != 'json':
+        response = _binary_response(df, fmt)
+        response.headers['X-Snapshot-Version'] = version or ''
+        response.headers['X-Changes-Reset'] = 'true' if reset else 'false'
+        return response
+
+    df = df.replace([float('inf'), float('-inf')], None)
+    df = df.fillna('')
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime('%Y-%m-%d')
+    data = df.to_dict('records')
+    return jsonify({
+        'success': True,
+        'data': data,
+        'total_records': len(data),
+        'reset': reset,
+        'snapshot_version': version
+    })
+
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """Feed incremental: filas nuevas o modificadas desde una versión o fecha.
+
+    Parámetros: dataset (radianza|pib), version (token snapshot_version que tiene el cliente)
+    o since (última fecha vista, YYYY-MM-DD), municipio opcional y format (json|arrow|msgpack).
+    Con reset=true el cliente debe reemplazar su copia por las filas recibidas.
+    """
+    try:
+        dataset = request.args.get('dataset', 'radianza').lower()
+        since_version = request.args.get('version')
+        since = request.args.get('since')
+        try:
+            fmt = _negotiate_format()
+            spec = _get_dataset(dataset)
+            if not since_version and not since:
+                raise ValueError('Indica version=<snapshot_version> o since=<YYYY-MM-DD>')
+            reset = False
+            if since_version:
+                try:
+                    df, version, reset = changes_since_version(dataset, since_version)
+                except StaleVersionError:
+                    # Versión fuera del historial: si el cliente mandó su última fecha, se usa esa
+                    if not since:
+                        raise
+                    df, version = changes_since_date(dataset, since)
+            else:
+                df, version = changes_since_date(dataset, since)
+        except StaleVersionError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'snapshot_version': _SNAPSHOT_VERSIONS.get(dataset)
+            }), 410
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        municipio = request.args.get('municipio')
+        if municipio:
+            df = df[df[spec['municipio']].str.lower() == municipio.lower()]
+        return _changes_payload(df, fmt, version, reset)
+    except Exception as e:
+        import traceback
+        error_msg = f"Error en get_changes: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc() if app.debug else None
+        }), 500
+
+# ==================== PROCESOS DE CÓMPUTO ====================
+
+# Las agregaciones pesadas corren en procesos aparte y el hilo de la petición solo espera el
+# resultado, así el GIL queda libre para los endpoints baratos. Los procesos leen el snapshot
+# de un archivo Arrow IPC mapeado en memoria: una escritura por versión, solo lectura.
+_IN_COMPUTE_WORKER = multiprocessing.parent_process() is not None
+_COMPUTE_EXECUTOR = None
+_COMPUTE_LOCK = threading.Lock()
+_COMPUTE_PUBLISH_LOCK = threading.Lock()
+_COMPUTE_PUBLISHED = {}
+_COMPUTE_STATS = {'workers': COMPUTE_WORKERS, 'offloaded': 0, 'inline': 0, 'broken_pool': 0, 'timeouts': 0,
+                  'offloaded_seconds': 0.0}
+# Dentro de cada proceso: dataset -> (versión, DataFrame)
+_WORKER_SNAPSHOTS = {}
+
+
+class ComputeTimeoutError(Exception):
+    """La tarea no terminó en COMPUTE_TIMEOUT_SECONDS"""
+
+
+def compute_timeout_response(error):
+    return jsonify({'success': False, 'error': str(error)}), 503, {'Retry-After': '30'}
+
+
+def compute_enabled():
+    """El pool aplica al snapshot completo en memoria (no a particiones ni a modo streaming)"""
+    return COMPUTE_WORKERS > 0 and not STREAMING_MODE and not BLOB_PREFIX and not _IN_COMPUTE_WORKER
+
+
+def _get_compute_executor():
+    global _COMPUTE_EXECUTOR
+    with _COMPUTE_LOCK:
+        if _COMPUTE_EXECUTOR is None:
+            # spawn y no fork: un fork desde gunicorn con hilos puede heredar locks tomados
+            _COMPUTE_EXECUTOR = ProcessPoolExecutor(max_workers=COMPUTE_WORKERS,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+        return _COMPUTE_EXECUTOR
+
+
+def _reset_compute_executor(broken):
+    global _COMPUTE_EXECUTOR
+    with _COMPUTE_LOCK:
+        if _COMPUTE_EXECUTOR is broken:
+            _COMPUTE_EXECUTOR = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _release_compute_workers(dataset):
+    """Desalojo del presupuesto: los procesos terminan al acabar sus tareas y liberan sus
+    copias del snapshot; el pool se vuelve a crear con la siguiente tarea.
+
+    Se olvida la publicación para que el próximo publish_snapshot vuelva a registrar la
+    entrada (sin tomar _COMPUTE_PUBLISH_LOCK: el desalojo puede ocurrir dentro de él).
+    """
+    global _COMPUTE_EXECUTOR
+    _COMPUTE_PUBLISHED.pop(dataset, None)
+    with _COMPUTE_LOCK:
+        executor, _COMPUTE_EXECUTOR = _COMPUTE_EXECUTOR, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def publish_snapshot(dataset):
+    """Escribe el snapshot vigente como Arrow IPC para los procesos (una vez por versión)"""
+    df = DATASETS[dataset]['loader']()
+    version = _SNAPSHOT_VERSIONS.get(dataset)
+    with _COMPUTE_PUBLISH_LOCK:
+        published = _COMPUTE_PUBLISHED.get(dataset)
+        if published and published[0] == version and os.path.exists(published[1]):
+            return published
+        os.makedirs(SPILL_DIR, exist_ok=True)
+        path = os.path.join(SPILL_DIR, f'compute-{dataset}-{version}.arrow')
+        # Tras un desalojo el archivo de la versión sigue en disco: solo se vuelve a registrar
+        if not os.path.exists(path):
+            tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+        # El archivo anterior se conserva: puede haber tareas en vuelo que todavía lo leen
+        keep = {path, published[1] if published else None}
+        for old_path in glob.glob(os.path.join(SPILL_DIR, f'compute-{dataset}-*.arrow')):
+            if old_path not in keep:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+        _COMPUTE_PUBLISHED[dataset] = (version, path)
+        # Estimación: el archivo (page cache compartido) más una copia del frame por proceso,
+        # cota superior porque las columnas numéricas mapeadas no se copian
+        MEMORY_BUDGET.register('snapshot', f'compute:{dataset}',
+                               os.path.getsize(path) + frame_nbytes(df) * COMPUTE_WORKERS,
+                               evict=lambda: _release_compute_workers(dataset))
+        return version, path
+
+
+def _worker_snapshot(dataset, version, path):
+    """Snapshot del proceso de cómputo; se relee solo cuando cambia la versión"""
+    cached = _WORKER_SNAPSHOTS.get(dataset)
+    if cached is None or cached[0] != version:
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        # split_blocks: las columnas numéricas sin nulos quedan como vistas del archivo mapeado
+        cached = (version, table.to_pandas(split_blocks=True))
+        _WORKER_SNAPSHOTS[dataset] = cached
+    return cached[1]
+
+
+def _compute_task(task, dataset, version, path, kwargs):
+    """Punto de entrada en el proceso de cómputo"""
+    return _COMPUTE_TASKS[task](_worker_snapshot(dataset, version, path), **kwargs)
+
+
+def run_compute(task, dataset, frame_args=None, frame=None, **kwargs):
+    """Ejecuta la tarea en el pool de procesos, o en este hilo si el pool no aplica.
+
+    En el hilo se usa `frame` si el endpoint ya lo cargó, o el loader por rango
+    (particiones, streaming) con frame_args.
+    """
+    started = time.perf_counter()
+    offload = False
+    if compute_enabled():
+        version, path = publish_snapshot(dataset)
+        # Si el presupuesto desalojó los procesos al registrarlos no hay lugar para ellos
+        offload = dataset in _COMPUTE_PUBLISHED
+    if offload:
+        executor = _get_compute_executor()
+        MEMORY_BUDGET.touch('snapshot', f'compute:{dataset}')
+        try:
+            try:
+                future = executor.submit(_compute_task, task, dataset, version, path, kwargs)
+            except RuntimeError:
+                # Un desalojo concurrente cerró el pool entre que se obtuvo y se usó
+                raise BrokenProcessPool('El pool de cómputo se cerró')
+            try:
+                result = future.result(timeout=COMPUTE_TIMEOUT_SECONDS)
+            except FutureTimeoutError:
+                # Si seguía en cola no llega a ejecutarse; si ya corría, el proceso la termina
+                future.cancel()
+                _COMPUTE_STATS['timeouts'] += 1
+                raise ComputeTimeoutError(
+                    f'La tarea {task} superó {COMPUTE_TIMEOUT_SECONDS:g} s, intenta de nuevo más tarde')
+            _COMPUTE_STATS['offloaded'] += 1
+            _COMPUTE_STATS['offloaded_seconds'] = round(_COMPUTE_STATS['offloaded_seconds'] + time.perf_counter() - started, 4)
+            return result
+        except BrokenProcessPool:
+            # Un proceso murió (p. ej. OOM) o el pool se cerró: se recrea y esta petición se resuelve aquí
+            _COMPUTE_STATS['broken_pool'] += 1
+            _reset_compute_executor(executor)
+
+    spec = DATASETS[dataset]
+    if frame is not None:
+        df = frame
+    elif frame_args is not None and 'range_loader' in spec:
+        df = spec['range_loader'](frame_args)
+    else:
+        df = spec['loader']()
+    result = _COMPUTE_TASKS[task](df, **kwargs)
+    _COMPUTE_STATS['inline'] += 1
+    return result
+
+
+def compute_stats(df):
+    """Estadísticas generales y por municipio de /api/stats"""
+    # Estadísticas por municipio
+    try:
+        # Calcular estadísticas individuales para evitar MultiIndex
+        stats_by_municipio = df.groupby('Municipio').agg({
+            'Media_de_radianza': ['mean', 'max', 'min'],
+            'Suma_de_radianza': 'sum' if 'Suma_de_radianza' in df.columns else 'count',
+            'Cantidad_de_pixeles': 'sum' if 'Cantidad_de_pixeles' in df.columns else 'count'
+        }).round(2)
+        
+        # Aplanar el MultiIndex de columnas
+        stats_by_municipio.columns = ['_'.join(col).strip() if isinstance(col, tuple) else col 
+                                      for col in stats_by_municipio.columns.values]
+        
+        # Convertir a diccionario con claves string
+        by_municipio_dict = {}
+        for municipio, row in stats_by_municipio.iterrows():
+            municipio_str = str(municipio)
+            by_municipio_dict[municipio_str] = {}
+            for col in stats_by_municipio.columns:
+                value = row[col]
+                # Convertir numpy types a tipos nativos de Python
+                if pd.isna(value):
+                    by_municipio_dict[municipio_str][col] = None
+                elif isinstance(value, (int, float)):
+                    by_municipio_dict[municipio_str][col] = float(value)
+                else:
+                    # Intentar convertir a float si es posible
+                    try:
+                        by_municipio_dict[municipio_str][col] = float(value)
+                    except (ValueError, TypeError):
+                        by_municipio_dict[municipio_str][col] = str(value) if value is not None else None
+    except Exception as e:
+        import traceback
+        print(f"Error al calcular stats por municipio: {str(e)}\n{traceback.format_exc()}")
+        by_municipio_dict = {}
+    
+    # Estadísticas generales
+    general_stats = {
+        'total_records': len(df),
+        'total_municipios': df['Municipio'].nunique() if 'Municipio' in df.columns else 0,
+        'fecha_min': str(df['Fecha'].min()) if 'Fecha' in df.columns else 'N/A',
+        'fecha_max': str(df['Fecha'].max()) if 'Fecha' in df.columns else 'N/A',
+        'radianza_promedio': float(df['Media_de_radianza'].mean()) if 'Media_de_radianza' in df.columns else 0.0,
+        'radianza_maxima': float(df['Maximo_de_radianza'].max()) if 'Maximo_de_radianza' in df.columns else 0.0,
+        'radianza_minima': float(df['Minimo_de_radianza'].min()) if 'Minimo_de_radianza' in df.columns else 0.0
+    }
+    
+    return {
+        'success': True,
+        'general': general_stats,
+        'by_municipio': by_municipio_dict
+    }
+
+
+def compute_comparison(df, metric, top_n, year=None):
+    """Ranking de municipios por promedio de la métrica (de /api/comparison)"""
+    # Filtro por año
+    if year and 'Fecha' in df.columns:
+        fechas = df['Fecha']
+        if not pd.api.types.is_datetime64_any_dtype(fechas):
+            fechas = pd.to_datetime(fechas, errors='coerce')
+        df = df[fechas.dt.year == year]
+    
+    # Convertir métrica a numérico de forma segura (sin modificar el snapshot)
+    values = pd.to_numeric(df[metric], errors='coerce').rename('promedio')
+    agg = (
+        values.groupby(df['Municipio'])
+        .mean()
+        .reset_index()
+        .sort_values('promedio', ascending=False)
+        .head(top_n)
+    )
+    # Convertir tipos
+    agg['Municipio'] = agg['Municipio'].astype(str)
+    agg['promedio'] = agg['promedio'].astype(float).round(2)
+    return agg.to_dict('records')
+
+
+def render_radianza_data(df, args, fmt):
+    """Filtros y serialización de /api/data; devuelve (cuerpo, mimetype, headers)"""
+    args = MultiDict(args)
+
+    # Parámetros de query
+    limit = args.get('limit', type=int)
+    columns = args.get('columns')  # coma separada
+    municipio = args.get('municipio')
+    from_date = args.get('from')
+    to_date = args.get('to')
+    year = args.get('year', type=int)
+
+    # Filtros
+    if municipio and 'Municipio' in df.columns:
+        df = df[df['Municipio'].str.lower() == municipio.lower()]
+    if from_date and 'Fecha' in df.columns and pd.api.types.is_datetime64_any_dtype(df['Fecha']):
+        df = df[df['Fecha'] >= pd.to_datetime(from_date)]
+    if to_date and 'Fecha' in df.columns and pd.api.types.is_datetime64_any_dtype(df['Fecha']):
+        df = df[df['Fecha'] <= pd.to_datetime(to_date)]
+    # Filtro por año
+    if year and 'Fecha' in df.columns:
+        if not pd.api.types.is_datetime64_any_dtype(df['Fecha']):
+            df = df.copy()
+            df['Fecha'] = pd.to_datetime(df['Fecha'], errors='coerce')
+        df = df[df['Fecha'].dt.year == year]
+    # Orden por fecha si existe
+    if 'Fecha' in df.columns and pd.api.types.is_datetime64_any_dtype(df['Fecha']):
+        df = df.sort_values('Fecha')
+
+    # Selección de columnas
+    if columns:
+        cols = [c.strip() for c in columns.split(',') if c.strip() in df.columns]
+        if cols:
+            df = df[cols]
+
+    # Límite
+    if limit is not None and limit > 0:
+        df = df.head(limit)
+
+    # Formatos binarios: se envían los tipos originales, sin fillna
+    if fmt != 'json':
+        response = _binary_response(df, fmt)
+        headers = {k: v for k, v in response.headers.items() if k.startswith('X-')}
+        return response.get_data(), response.mimetype, headers
+    
+    # Convertir DataFrame a formato JSON
+    # Manejar NaN y valores infinitos
+    df = df.replace([float('inf'), float('-inf')], None)
+    df = df.fillna('')
+    
+    # Convertir fechas a string para JSON
+    if 'Fecha' in df.columns and pd.api.types.is_datetime64_any_dtype(df['Fecha']):
+        df['Fecha'] = df['Fecha'].dt.strftime('%Y-%m-%d')
+    
+    data = df.to_dict('records')
+    response = app.json.response({
+        'success': True,
+        'data': data,
+        'total_records': len(data)
+    })
+    return response.get_data(), response.mimetype, {}
+
+
+_COMPUTE_TASKS = {
+    'stats': compute_stats,
+    'comparison': compute_comparison,
+    'data': render_radianza_data,
+}
+
+@app.route('/api/data', methods=['GET'])
+def get_data():
+    """Endpoint para obtener todos los datos"""
+    try:
+        try:
+            fmt = _negotiate_format()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        # Paginación por cursor: page_size y/o cursor (orden por fecha y municipio)
+        if 'page_size' in request.args or 'cursor' in request.args:
+            return _page_response('radianza', fmt, request.args)
+
+        # Filtrado y serialización en el pool de procesos (el hilo solo espera los bytes)
+        body, mimetype, headers = run_compute('data', 'radianza', frame_args=request.args,
+                                              args=list(request.args.items(multi=True)), fmt=fmt)
+        return Response(body, mimetype=mimetype, headers=headers)
+    except ComputeTimeoutError as e:
+        return compute_timeout_response(e)
     except Exception as e:
         import traceback
         error_msg = f"Error en get_data: {str(e)}\n{traceback.format_exc()}"
@@ -218,6 +2042,15 @@ def get_data():
 def get_years():
     """Endpoint para obtener lista de años únicos disponibles"""
     try:
+        if STREAMING_MODE:
+            acc = get_streaming_state()['by_municipio_year']
+            years = sorted({int(y) for y in acc.index.get_level_values('year').unique()}, reverse=True)
+            return jsonify({'success': True, 'years': years})
+        if BLOB_PREFIX:
+            # Cada partición cubre un año o un mes: los años salen del listado, sin leer filas
+            years = sorted({part['start'].year for part in list_radianza_partitions()}, reverse=True)
+            return jsonify({'success': True, 'years': years})
+
         df = get_blob_data()
         
         if 'Fecha' not in df.columns:
@@ -254,17 +2087,14 @@ def get_years():
 def get_municipios():
     """Endpoint para obtener lista de municipios únicos"""
     try:
-        df = get_blob_data()
-        
-        if 'Municipio' not in df.columns:
+        if not STREAMING_MODE and not BLOB_PREFIX and 'Municipio' not in get_blob_data().columns:
             return jsonify({
                 'success': False,
                 'error': 'La columna "Municipio" no existe en el CSV'
             }), 500
         
-        municipios = df['Municipio'].dropna().astype(str).unique().tolist()
-        municipios = [str(m) for m in municipios if m]  # Convertir a string y filtrar vacíos
-        municipios.sort()
+        # Lista ya ordenada del índice de búsqueda (se construye una vez por snapshot)
+        municipios = get_search_index('radianza')['municipios']
         
         return jsonify({
             'success': True,
@@ -280,11 +2110,28 @@ def get_municipios():
             'traceback': traceback.format_exc() if app.debug else None
         }), 500
 
+@app.route('/api/municipios/search', methods=['GET'])
+def search_radianza_municipios():
+    """Autocompletado de municipios: ?q=<texto>&limit=<K> (sin acentos ni mayúsculas)"""
+    try:
+        return _search_response('radianza')
+    except Exception as e:
+        import traceback
+        error_msg = f"Error en search_radianza_municipios: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc() if app.debug else None
+        }), 500
+
 @app.route('/api/municipio/<municipio>', methods=['GET'])
 def get_municipio_data(municipio):
     """Endpoint para obtener datos de un municipio específico"""
     try:
-        df = get_blob_data().copy()
+        # Decodificar el nombre del municipio si viene codificado
+        municipio_decoded = municipio.replace('%20', ' ').replace('+', ' ')
+        df = get_radianza_frame(request.args, municipio=municipio_decoded).copy()
         
         if 'Municipio' not in df.columns:
             return jsonify({
@@ -292,8 +2139,6 @@ def get_municipio_data(municipio):
                 'error': 'La columna "Municipio" no existe en el CSV'
             }), 500
         
-        # Decodificar el nombre del municipio si viene codificado
-        municipio_decoded = municipio.replace('%20', ' ').replace('+', ' ')
         municipio_data = df[df['Municipio'].str.lower() == municipio_decoded.lower()]
 
         # Filtros y límite
@@ -352,7 +2197,10 @@ def get_municipio_data(municipio):
 def get_stats():
     """Endpoint para obtener estadísticas generales"""
     try:
-        df = get_blob_data().copy()
+        if STREAMING_MODE:
+            return jsonify(streaming_stats_payload(get_streaming_state()))
+
+        df = get_blob_data()
         
         # Verificar que las columnas necesarias existan
         required_cols = ['Municipio', 'Media_de_radianza', 'Maximo_de_radianza', 'Minimo_de_radianza']
@@ -363,58 +2211,9 @@ def get_stats():
                 'error': f'Columnas faltantes en el CSV: {missing_cols}'
             }), 500
         
-        # Estadísticas por municipio
-        try:
-            # Calcular estadísticas individuales para evitar MultiIndex
-            stats_by_municipio = df.groupby('Municipio').agg({
-                'Media_de_radianza': ['mean', 'max', 'min'],
-                'Suma_de_radianza': 'sum' if 'Suma_de_radianza' in df.columns else 'count',
-                'Cantidad_de_pixeles': 'sum' if 'Cantidad_de_pixeles' in df.columns else 'count'
-            }).round(2)
-            
-            # Aplanar el MultiIndex de columnas
-            stats_by_municipio.columns = ['_'.join(col).strip() if isinstance(col, tuple) else col 
-                                          for col in stats_by_municipio.columns.values]
-            
-            # Convertir a diccionario con claves string
-            by_municipio_dict = {}
-            for municipio, row in stats_by_municipio.iterrows():
-                municipio_str = str(municipio)
-                by_municipio_dict[municipio_str] = {}
-                for col in stats_by_municipio.columns:
-                    value = row[col]
-                    # Convertir numpy types a tipos nativos de Python
-                    if pd.isna(value):
-                        by_municipio_dict[municipio_str][col] = None
-                    elif isinstance(value, (int, float)):
-                        by_municipio_dict[municipio_str][col] = float(value)
-                    else:
-                        # Intentar convertir a float si es posible
-                        try:
-                            by_municipio_dict[municipio_str][col] = float(value)
-                        except (ValueError, TypeError):
-                            by_municipio_dict[municipio_str][col] = str(value) if value is not None else None
-        except Exception as e:
-            import traceback
-            print(f"Error al calcular stats por municipio: {str(e)}\n{traceback.format_exc()}")
-            by_municipio_dict = {}
-        
-        # Estadísticas generales
-        general_stats = {
-            'total_records': len(df),
-            'total_municipios': df['Municipio'].nunique() if 'Municipio' in df.columns else 0,
-            'fecha_min': str(df['Fecha'].min()) if 'Fecha' in df.columns else 'N/A',
-            'fecha_max': str(df['Fecha'].max()) if 'Fecha' in df.columns else 'N/A',
-            'radianza_promedio': float(df['Media_de_radianza'].mean()) if 'Media_de_radianza' in df.columns else 0.0,
-            'radianza_maxima': float(df['Maximo_de_radianza'].max()) if 'Maximo_de_radianza' in df.columns else 0.0,
-            'radianza_minima': float(df['Minimo_de_radianza'].min()) if 'Minimo_de_radianza' in df.columns else 0.0
-        }
-        
-        return jsonify({
-            'success': True,
-            'general': general_stats,
-            'by_municipio': by_municipio_dict
-        })
+        return jsonify(run_compute('stats', 'radianza', frame=df))
+    except ComputeTimeoutError as e:
+        return compute_timeout_response(e)
     except Exception as e:
         import traceback
         error_msg = f"Error en get_stats: {str(e)}\n{traceback.format_exc()}"
@@ -427,116 +2226,108 @@ def get_stats():
 
 @app.route('/api/comparison', methods=['GET'])
 def comparison():
-    """Ranking de municipios por métrica agregada (promedio)."""
-    try:
-        metric = request.args.get('metric', default='Media_de_radianza')
-        top_n = request.args.get('top', default=10, type=int)
-        year = request.args.get('year', type=int)
-        df = get_blob_data().copy()
-        if 'Municipio' not in df.columns or metric not in df.columns:
-            return jsonify({'success': False, 'error': 'Campos requeridos no existen'}), 400
-        
-        # Filtro por año
-        if year and 'Fecha' in df.columns:
-            if not pd.api.types.is_datetime64_any_dtype(df['Fecha']):
-                df['Fecha'] = pd.to_datetime(df['Fecha'], errors='coerce')
-            df = df[df['Fecha'].dt.year == year]
-        
-        # Convertir métrica a numérico de forma segura
-        df[metric] = pd.to_numeric(df[metric], errors='coerce')
-        agg = (
-            df.groupby('Municipio', as_index=False)[metric]
-            .mean()
-            .rename(columns={metric: 'promedio'})
-            .sort_values('promedio', ascending=False)
-            .head(top_n)
-        )
-        # Convertir tipos
-        agg['Municipio'] = agg['Municipio'].astype(str)
-        agg['promedio'] = agg['promedio'].astype(float).round(2)
-        return jsonify({'success': True, 'data': agg.to_dict('records')})
-    except Exception as e:
-        import traceback
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'traceback': traceback.format_exc() if app.debug else None
-        }), 500
-
-@app.route('/api/download', methods=['GET'])
-def download_data():
-    """Endpoint para descargar datos filtrados como CSV"""
-    try:
-        df = get_blob_data().copy()
-        
-        # Aplicar los mismos filtros que en /api/data
-        municipio = request.args.get('municipio')
-        municipios = request.args.getlist('municipios')  # Lista de municipios
-        from_date = request.args.get('from')
-        to_date = request.args.get('to')
-        year = request.args.get('year', type=int)
-        columns = request.args.get('columns')
-        
-        # Filtro por municipio(s)
-        if municipios:
-            if 'Municipio' in df.columns:
-                df = df[df['Municipio'].str.lower().isin([m.lower() for m in municipios])]
-        elif municipio and 'Municipio' in df.columns:
-            df = df[df['Municipio'].str.lower() == municipio.lower()]
-        
-        # Filtros de fecha
-        if 'Fecha' in df.columns:
-            if not pd.api.types.is_datetime64_any_dtype(df['Fecha']):
-                df['Fecha'] = pd.to_datetime(df['Fecha'], errors='coerce')
-            
-            if from_date:
-                df = df[df['Fecha'] >= pd.to_datetime(from_date)]
-            if to_date:
-                df = df[df['Fecha'] <= pd.to_datetime(to_date)]
-            if year:
-                df = df[df['Fecha'].dt.year == year]
-            
-            # Ordenar por fecha
-            df = df.sort_values('Fecha')
-        
-        # Selección de columnas
-        if columns:
-            cols = [c.strip() for c in columns.split(',') if c.strip() in df.columns]
-            if cols:
-                df = df[cols]
-        
-        # Convertir fechas a string formato legible
-        if 'Fecha' in df.columns and pd.api.types.is_datetime64_any_dtype(df['Fecha']):
-            df['Fecha'] = df['Fecha'].dt.strftime('%Y-%m-%d')
-        
-        # Reemplazar NaN y valores infinitos
-        df = df.replace([float('inf'), float('-inf')], '')
-        df = df.fillna('')
+    """Ranking de municipios por métrica agregada.
+
+    Parámetros: metric, top, year. Con mode=slope|cagr (o mean con dataset=pib, entidad,
+    order=asc, from/to o years=N) el ranking sale de la pasada vectorizada por serie.
+    """
+    try:
+        metric = request.args.get('metric', default='Media_de_radianza')
+        top_n = request.args.get('top', default=10, type=int)
+        year = request.args.get('year', type=int)
+        if any(key in request.args for key in ('mode', 'dataset', 'entidad', 'entidad_federativa',
+                                                'order', 'from', 'to', 'years')):
+            try:
+                ranking = get_ranking(request.args.get('dataset', 'radianza'), request.args)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            return jsonify({'success': True, **ranking})
+        if STREAMING_MODE:
+            try:
+                data = streaming_comparison(get_streaming_state(), metric, top_n, year)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            return jsonify({'success': True, 'data': data})
+        frame_args = MultiDict({'year': year} if year else {})
+        df = get_radianza_frame(frame_args)
+        if 'Municipio' not in df.columns or metric not in df.columns:
+            return jsonify({'success': False, 'error': 'Campos requeridos no existen'}), 400
         
-        # Convertir DataFrame a CSV
-        output = StringIO()
-        df.to_csv(output, index=False, encoding='utf-8-sig')  # utf-8-sig para Excel
-        output.seek(0)
+        data = run_compute('comparison', 'radianza', frame_args=frame_args, frame=df,
+                           metric=metric, top_n=top_n, year=year)
+        return jsonify({'success': True, 'data': data})
+    except ComputeTimeoutError as e:
+        return compute_timeout_response(e)
+    except Exception as e:
+        import traceback
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc() if app.debug else None
+        }), 500
+
+def build_radianza_export(args):
+    """Aplica los filtros de /api/download y devuelve (df, nombre base del archivo)"""
+    df = get_radianza_frame(args).copy()
+    
+    # Aplicar los mismos filtros que en /api/data
+    municipio = args.get('municipio')
+    municipios = args.getlist('municipios')  # Lista de municipios
+    from_date = args.get('from')
+    to_date = args.get('to')
+    year = args.get('year', type=int)
+    columns = args.get('columns')
+    
+    # Filtro por municipio(s)
+    if municipios:
+        if 'Municipio' in df.columns:
+            df = df[df['Municipio'].str.lower().isin([m.lower() for m in municipios])]
+    elif municipio and 'Municipio' in df.columns:
+        df = df[df['Municipio'].str.lower() == municipio.lower()]
+    
+    # Filtros de fecha
+    if 'Fecha' in df.columns:
+        if not pd.api.types.is_datetime64_any_dtype(df['Fecha']):
+            df['Fecha'] = pd.to_datetime(df['Fecha'], errors='coerce')
         
-        # Generar nombre de archivo
-        filename = 'datos_radianza'
-        if municipios:
-            filename += f"_{len(municipios)}_municipios"
-        elif municipio:
-            filename += f"_{municipio.replace(' ', '_')}"
+        if from_date:
+            df = df[df['Fecha'] >= pd.to_datetime(from_date)]
+        if to_date:
+            df = df[df['Fecha'] <= pd.to_datetime(to_date)]
         if year:
-            filename += f"_{year}"
-        filename += '.csv'
+            df = df[df['Fecha'].dt.year == year]
         
-        # Crear respuesta con headers apropiados para descarga
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Content-Type': 'text/csv; charset=utf-8-sig'
-            }
-        )
+        # Ordenar por fecha
+        df = df.sort_values('Fecha')
+    
+    # Selección de columnas
+    if columns:
+        cols = [c.strip() for c in columns.split(',') if c.strip() in df.columns]
+        if cols:
+            df = df[cols]
+    
+    # Generar nombre de archivo
+    filename = 'datos_radianza'
+    if municipios:
+        filename += f"_{len(municipios)}_municipios"
+    elif municipio:
+        filename += f"_{municipio.replace(' ', '_')}"
+    if year:
+        filename += f"_{year}"
+    return df, filename
+
+@app.route('/api/download', methods=['GET'])
+def download_data():
+    """Endpoint para descargar datos filtrados como CSV o Parquet (format=parquet)"""
+    try:
+        started = time.perf_counter()
+        export_format = request.args.get('format', 'csv').lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'success': False, 'error': 'Formato no válido, usa csv o parquet'}), 400
+        
+        df, filename = build_radianza_export(request.args)
+        chunks = render_export(df, 'radianza', export_format, started)
+        return _export_response(chunks, filename, export_format, started)
     except Exception as e:
         import traceback
         error_msg = f"Error en download_data: {str(e)}\n{traceback.format_exc()}"
@@ -553,6 +2344,15 @@ def download_data():
 def get_pib_data_endpoint():
     """Endpoint para obtener datos de PIB"""
     try:
+        try:
+            fmt = _negotiate_format()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        # Paginación por cursor: page_size y/o cursor (orden por fecha y municipio)
+        if 'page_size' in request.args or 'cursor' in request.args:
+            return _page_response('pib', fmt, request.args)
+
         df = get_pib_data().copy()
 
         # Parámetros de query
@@ -591,6 +2391,10 @@ def get_pib_data_endpoint():
         # Límite
         if limit is not None and limit > 0:
             df = df.head(limit)
+
+        # Formatos binarios: se envían los tipos originales, sin fillna
+        if fmt != 'json':
+            return _binary_response(df, fmt)
         
         # Convertir DataFrame a formato JSON
         df = df.replace([float('inf'), float('-inf')], None)
@@ -629,9 +2433,7 @@ def get_pib_municipios():
                 'error': 'La columna "municipio" no existe en el CSV'
             }), 500
         
-        municipios = df['municipio'].dropna().astype(str).unique().tolist()
-        municipios = [str(m) for m in municipios if m]
-        municipios.sort()
+        municipios = get_search_index('pib')['municipios']
         
         return jsonify({
             'success': True,
@@ -647,6 +2449,21 @@ def get_pib_municipios():
             'traceback': traceback.format_exc() if app.debug else None
         }), 500
 
+@app.route('/api/pib/municipios/search', methods=['GET'])
+def search_pib_municipios():
+    """Autocompletado de municipios de PIB: ?q=<texto>&entidad_federativa=<entidad>&limit=<K>"""
+    try:
+        return _search_response('pib')
+    except Exception as e:
+        import traceback
+        error_msg = f"Error en search_pib_municipios: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc() if app.debug else None
+        }), 500
+
 @app.route('/api/pib/entidades', methods=['GET'])
 def get_pib_entidades():
     """Endpoint para obtener lista de entidades federativas únicas"""
@@ -703,7 +2520,554 @@ def get_pib_years():
         })
     except Exception as e:
         import traceback
-        error_msg = f"Error en get_pib_years: {str(e)}\n{traceback.format_exc()}"
+        error_msg = f"Error en get_pib_years: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc() if app.debug else None
+        }), 500
+
+@app.route('/api/pib/municipio/<municipio>', methods=['GET'])
+def get_pib_municipio_data(municipio):
+    """Endpoint para obtener datos de PIB de un municipio específico"""
+    try:
+        df = get_pib_data().copy()
+        
+        if 'municipio' not in df.columns:
+            return jsonify({
+                'success': False,
+                'error': 'La columna "municipio" no existe en el CSV'
+            }), 500
+        
+        municipio_decoded = municipio.replace('%20', ' ').replace('+', ' ')
+        municipio_data = df[df['municipio'].str.lower() == municipio_decoded.lower()]
+
+        limit = request.args.get('limit', default=None, type=int)
+        from_date = request.args.get('from')
+        to_date = request.args.get('to')
+        year = request.args.get('year', type=int)
+        
+        if 'fecha' in municipio_data.columns:
+            if not pd.api.types.is_datetime64_any_dtype(municipio_data['fecha']):
+                municipio_data['fecha'] = pd.to_datetime(municipio_data['fecha'], errors='coerce')
+            municipio_data = municipio_data.sort_values('fecha')
+            if from_date:
+                municipio_data = municipio_data[municipio_data['fecha'] >= pd.to_datetime(from_date)]
+            if to_date:
+                municipio_data = municipio_data[municipio_data['fecha'] <= pd.to_datetime(to_date)]
+            if year:
+                municipio_data = municipio_data[municipio_data['fecha'].dt.year == year]
+        
+        if limit and limit > 0:
+            municipio_data = municipio_data.tail(limit)
+        
+        if municipio_data.empty:
+            return jsonify({
+                'success': False,
+                'error': f'Municipio {municipio_decoded} no encontrado'
+            }), 404
+        
+        if 'fecha' in municipio_data.columns and pd.api.types.is_datetime64_any_dtype(municipio_data['fecha']):
+            municipio_data['fecha'] = municipio_data['fecha'].dt.strftime('%Y-%m-%d')
+        
+        municipio_data = municipio_data.replace([float('inf'), float('-inf')], None)
+        municipio_data = municipio_data.fillna('')
+        
+        data = municipio_data.to_dict('records')
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'municipio': municipio_decoded
+        })
+    except Exception as e:
+        import traceback
+        error_msg = f"Error en get_pib_municipio_data: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc() if app.debug else None
+        }), 500
+
+@app.route('/api/pib/stats', methods=['GET'])
+def get_pib_stats():
+    """Endpoint para obtener estadísticas de PIB"""
+    try:
+        df = get_pib_data().copy()
+        
+        # Estadísticas generales
+        general_stats = {
+            'total_records': len(df),
+            'total_municipios': df['municipio'].nunique() if 'municipio' in df.columns else 0,
+            'total_entidades': df['entidad_federativa'].nunique() if 'entidad_federativa' in df.columns else 0,
+            'fecha_min': str(df['fecha'].min()) if 'fecha' in df.columns else 'N/A',
+            'fecha_max': str(df['fecha'].max()) if 'fecha' in df.columns else 'N/A',
+            'pib_mun_promedio': float(df['pib_mun'].mean()) if 'pib_mun' in df.columns else 0.0,
+            'pib_mun_maximo': float(df['pib_mun'].max()) if 'pib_mun' in df.columns else 0.0,
+            'pib_mun_minimo': float(df['pib_mun'].min()) if 'pib_mun' in df.columns else 0.0,
+            'pibe_promedio': float(df['pibe'].mean()) if 'pibe' in df.columns else 0.0
+        }
+        
+        return jsonify({
+            'success': True,
+            'general': general_stats
+        })
+    except Exception as e:
+        import traceback
+        error_msg = f"Error en get_pib_stats: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc() if app.debug else None
+        }), 500
+
+def build_pib_export(args):
+    """Aplica los filtros de /api/pib/download y devuelve (df, nombre base del archivo)"""
+    df = get_pib_data().copy()
+    
+    # Aplicar los mismos filtros que en /api/pib/data
+    municipio = args.get('municipio')
+    municipios = args.getlist('municipios')  # Lista de municipios
+    from_date = args.get('from')
+    to_date = args.get('to')
+    
+    # Filtro por municipio(s)
+    if municipios:
+        if 'municipio' in df.columns:
+            df = df[df['municipio'].str.lower().isin([m.lower() for m in municipios])]
+    elif municipio and 'municipio' in df.columns:
+        df = df[df['municipio'].str.lower() == municipio.lower()]
+    
+    # Filtros de fecha
+    if 'fecha' in df.columns:
+        if not pd.api.types.is_datetime64_any_dtype(df['fecha']):
+            df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
+        
+        if from_date:
+            df = df[df['fecha'] >= pd.to_datetime(from_date)]
+        if to_date:
+            df = df[df['fecha'] <= pd.to_datetime(to_date)]
+        
+        # Ordenar por fecha
+        df = df.sort_values('fecha')
+    
+    # Selección de columnas - solo PIB municipal
+    # Incluir solo: fecha, municipio, entidad_federativa, pib_mun
+    pib_mun_columns = ['fecha', 'municipio', 'entidad_federativa', 'pib_mun']
+    available_columns = [col for col in pib_mun_columns if col in df.columns]
+    if available_columns:
+        df = df[available_columns]
+    
+    # Generar nombre de archivo
+    filename = 'datos_pib'
+    if municipios:
+        filename += f"_{len(municipios)}_municipios"
+    elif municipio:
+        filename += f"_{municipio.replace(' ', '_')}"
+    return df, filename
+
+@app.route('/api/pib/download', methods=['GET'])
+def download_pib_data():
+    """Endpoint para descargar datos de PIB filtrados como CSV o Parquet (format=parquet)"""
+    try:
+        started = time.perf_counter()
+        export_format = request.args.get('format', 'csv').lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'success': False, 'error': 'Formato no válido, usa csv o parquet'}), 400
+        
+        df, filename = build_pib_export(request.args)
+        chunks = render_export(df, 'pib', export_format, started)
+        return _export_response(chunks, filename, export_format, started)
+    except Exception as e:
+        import traceback
+        error_msg = f"Error en download_pib_data: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc() if app.debug else None
+        }), 500
+
+# ==================== EXPORTACIONES ASÍNCRONAS ====================
+
+# Los exports grandes corren en un pool acotado para no ocupar los hilos de gunicorn.
+# Los resultados se guardan en disco con clave (dataset, formato, filtros, snapshot).
+_EXPORT_BUILDERS = {
+    'radianza': build_radianza_export,
+    'pib': build_pib_export,
+}
+_EXPORT_EXECUTOR = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export')
+_EXPORT_JOBS = {}
+_EXPORT_JOBS_LOCK = threading.Lock()
+
+
+def _export_cache_key(dataset, export_format, args, version):
+    """Clave estable del export: mismos filtros sobre el mismo snapshot -> mismo archivo"""
+    items = sorted((k, v) for k, values in args.lists() if k not in ('dataset', 'format') for v in values)
+    raw = repr((dataset, export_format, items, version))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def _prune_export_cache():
+    """Elimina los archivos más antiguos si el cache en disco supera el límite"""
+    try:
+        entries = [os.path.join(EXPORT_CACHE_DIR, name) for name in os.listdir(EXPORT_CACHE_DIR)]
+        entries = [(os.path.getmtime(path), os.path.getsize(path), path)
+                   for path in entries if os.path.isfile(path) and not path.endswith('.tmp')]
+    except FileNotFoundError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= EXPORT_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def _prune_export_jobs():
+    """Olvida jobs terminados o con error: los vencidos, los cuyo archivo ya se purgó y,
+    si aún sobran, los más antiguos. Los jobs en cola o en curso nunca se eliminan."""
+    now = time.time()
+    with _EXPORT_JOBS_LOCK:
+        finished = []
+        for job_id, job in list(_EXPORT_JOBS.items()):
+            if job['status'] not in ('done', 'error'):
+                continue
+            finished_at = job.get('finished_at', job['submitted_at'])
+            expired = now - finished_at > EXPORT_JOB_TTL_SECONDS
+            if expired or (job['status'] == 'done' and not os.path.exists(job['path'])):
+                del _EXPORT_JOBS[job_id]
+            else:
+                finished.append((finished_at, job_id))
+        for _, job_id in sorted(finished)[:max(len(finished) - EXPORT_MAX_JOBS, 0)]:
+            del _EXPORT_JOBS[job_id]
+
+
+def _run_export_job(job):
+    """Ejecuta un export en segundo plano y lo escribe de forma atómica en disco"""
+    job['status'] = 'running'
+    job['started_at'] = time.time()
+    try:
+        started = time.perf_counter()
+        df, filename = _EXPORT_BUILDERS[job['dataset']](job['args'])
+        tmp_path = f"{job['path']}.{uuid.uuid4().hex}.tmp"
+        nbytes = 0
+        with open(tmp_path, 'wb') as fh:
+            # Cada bloque (row group en Parquet) va directo al archivo
+            for chunk in render_export(df, job['dataset'], job['format'], started):
+                fh.write(chunk)
+                nbytes += len(chunk)
+        os.replace(tmp_path, job['path'])
+        job.update({
+            'status': 'done',
+            'filename': f"{filename}.{job['format']}",
+            'bytes': nbytes,
+            'rows': len(df),
+            'seconds': round(time.perf_counter() - started, 4),
+        })
+    except Exception as e:
+        import traceback
+        print(f"Error en export {job['id']}: {str(e)}\n{traceback.format_exc()}")
+        job.update({'status': 'error', 'error': str(e)})
+    finally:
+        job['finished_at'] = time.time()
+        _prune_export_cache()
+        _prune_export_jobs()
+
+
+def _export_job_payload(job):
+    """Vista pública del job para las respuestas JSON"""
+    payload = {k: job[k] for k in ('id', 'dataset', 'format', 'status', 'cached', 'snapshot_version')}
+    for key in ('filename', 'bytes', 'rows', 'seconds', 'error'):
+        if key in job:
+            payload[key] = job[key]
+    payload['status_url'] = f"/api/exports/{job['id']}"
+    if job['status'] == 'done':
+        payload['result_url'] = f"/api/exports/{job['id']}/result"
+    return payload
+
+
+@app.route('/api/exports', methods=['POST'])
+def submit_export():
+    """Crea un job de exportación; acepta los mismos filtros que /api/download.
+
+    Los filtros pueden ir en la query string o en un cuerpo JSON
+    (p. ej. {"dataset": "pib", "format": "parquet", "municipios": ["Tlalpan"]}).
+    """
+    try:
+        args = MultiDict(request.args)
+        body = request.get_json(silent=True) or {}
+        for key, value in body.items():
+            args.setlist(key, [str(v) for v in value] if isinstance(value, list) else [str(value)])
+
+        dataset = args.get('dataset', 'radianza').lower()
+        export_format = args.get('format', 'csv').lower()
+        if dataset not in _EXPORT_BUILDERS:
+            return jsonify({'success': False, 'error': f'Dataset no válido: {dataset}'}), 400
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'success': False, 'error': 'Formato no válido, usa csv o parquet'}), 400
+
+        version = get_snapshot_version(dataset)
+        _prune_export_jobs()
+        job_id = _export_cache_key(dataset, export_format, args, version)
+        path = os.path.join(EXPORT_CACHE_DIR, f"{job_id}.{export_format}")
+
+        with _EXPORT_JOBS_LOCK:
+            job = _EXPORT_JOBS.get(job_id)
+            if job and job['status'] != 'error' and (job['status'] != 'done' or os.path.exists(path)):
+                # Mismo export en curso o ya terminado: se reutiliza
+                return jsonify({'success': True, 'job': _export_job_payload(job)}), 200 if job['status'] == 'done' else 202
+
+            job = {
+                'id': job_id,
+                'dataset': dataset,
+                'format': export_format,
+                'args': args,
+                'path': path,
+                'snapshot_version': version,
+                'cached': False,
+                'submitted_at': time.time(),
+            }
+            if os.path.exists(path):
+                # Resultado ya en disco (p. ej. de un proceso anterior): se sirve al instante
+                job.update({
+                    'status': 'done',
+                    'cached': True,
+                    'bytes': os.path.getsize(path),
+                    'filename': f"datos_{dataset}.{export_format}",
+                })
+                _EXPORT_JOBS[job_id] = job
+                return jsonify({'success': True, 'job': _export_job_payload(job)}), 200
+
+            pending = sum(1 for j in _EXPORT_JOBS.values() if j['status'] in ('queued', 'running'))
+            if pending >= EXPORT_MAX_PENDING:
+                return jsonify({
+                    'success': False,
+                    'error': 'Demasiadas exportaciones en curso, intenta más tarde'
+                }), 503, {'Retry-After': '30'}
+
+            os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+            job['status'] = 'queued'
+            _EXPORT_JOBS[job_id] = job
+        _EXPORT_EXECUTOR.submit(_run_export_job, job)
+        return jsonify({'success': True, 'job': _export_job_payload(job)}), 202
+    except Exception as e:
+        import traceback
+        error_msg = f"Error en submit_export: {str(e)}\n{traceback.format_exc()}"
+        print(error_msg)
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc() if app.debug else None
+        }), 500
+
+
+@app.route('/api/exports/<job_id>', methods=['GET'])
+def export_status(job_id):
+    """Estado de un job de exportación"""
+    job = _EXPORT_JOBS.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': f'Export {job_id} no encontrado'}), 404
+    return jsonify({'success': True, 'job': _export_job_payload(job)})
+
+
+@app.route('/api/exports/<job_id>/result', methods=['GET'])
+def export_result(job_id):
+    """Descarga el archivo generado por un job terminado"""
+    job = _EXPORT_JOBS.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': f'Export {job_id} no encontrado'}), 404
+    if job['status'] != 'done':
+        return jsonify({'success': False, 'job': _export_job_payload(job)}), 409
+    if not os.path.exists(job['path']):
+        # El archivo fue purgado del cache: hay que volver a solicitarlo
+        _EXPORT_JOBS.pop(job_id, None)
+        return jsonify({'success': False, 'error': 'El resultado expiró, vuelve a crear el export'}), 410
+    return send_from_directory(
+        EXPORT_CACHE_DIR,
+        os.path.basename(job['path']),
+        mimetype=EXPORT_FORMATS[job['format']].split(';')[0],
+        as_attachment=True,
+        download_name=job['filename']
+    )
+
+# ==================== CONSULTAS GENÉRICAS ====================
+
+_QUERY_OPERATORS = {
+    'eq': lambda s, v: s == v,
+    'ne': lambda s, v: s != v,
+    'gt': lambda s, v: s > v,
+    'gte': lambda s, v: s >= v,
+    'lt': lambda s, v: s < v,
+    'lte': lambda s, v: s <= v,
+}
+_QUERY_AGGREGATES = ('mean', 'sum', 'min', 'max', 'count', 'median', 'std')
+_QUERY_GROUP_KEYS = ('municipio', 'entidad_federativa', 'year', 'month')
+
+
+def _query_mask(df, spec, args):
+    """Construye la máscara booleana con todos los predicados de la consulta"""
+    mask = pd.Series(True, index=df.index)
+    mun_col, date_col, ent_col = spec['municipio'], spec['date'], spec['entidad']
+
+    municipios = [m for value in args.getlist('municipios') for m in value.split(',') if m.strip()]
+    if args.get('municipio'):
+        municipios.append(args.get('municipio'))
+    if municipios:
+        wanted = {m.strip().lower() for m in municipios}
+        mask &= df[mun_col].str.lower().isin(wanted)
+
+    entidad = args.get('entidad')
+    if entidad:
+        if not ent_col or ent_col not in df.columns:
+            raise ValueError('El dataset no tiene columna de entidad federativa')
+        mask &= df[ent_col].str.lower() == entidad.lower()
+
+    if date_col in df.columns:
+        if args.get('from'):
+            mask &= df[date_col] >= pd.to_datetime(args.get('from'))
+        if args.get('to'):
+            mask &= df[date_col] <= pd.to_datetime(args.get('to'))
+        year = args.get('year', type=int)
+        if year:
+            mask &= df[date_col].dt.year == year
+
+    # Umbrales numéricos: filter=columna:operador:valor (repetible)
+    for raw in args.getlist('filter'):
+        parts = raw.split(':')
+        if len(parts) != 3:
+            raise ValueError(f"Filtro inválido '{raw}', usa columna:operador:valor")
+        col, op, value = parts
+        if col not in df.columns:
+            raise ValueError(f"Columna desconocida en filtro: {col}")
+        if op not in _QUERY_OPERATORS:
+            raise ValueError(f"Operador no válido: {op}. Opciones: {', '.join(_QUERY_OPERATORS)}")
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            raise ValueError(f"La columna {col} no es numérica")
+        mask &= _QUERY_OPERATORS[op](df[col], float(value))
+    return mask
+
+
+def _query_group_keys(df, spec, group_by):
+    """Traduce las claves lógicas de agrupación a series alineadas con df"""
+    keys = []
+    for key in group_by:
+        if key not in _QUERY_GROUP_KEYS:
+            raise ValueError(f"Clave de agrupación no válida: {key}. Opciones: {', '.join(_QUERY_GROUP_KEYS)}")
+        if key == 'municipio':
+            keys.append(df[spec['municipio']].rename('municipio'))
+        elif key == 'entidad_federativa':
+            if not spec['entidad']:
+                raise ValueError('El dataset no tiene columna de entidad federativa')
+            keys.append(df[spec['entidad']].rename('entidad_federativa'))
+        elif key == 'year':
+            keys.append(df[spec['date']].dt.year.rename('year'))
+        else:
+            keys.append(df[spec['date']].dt.month.rename('month'))
+    return keys
+
+
+def _parse_aggregates(raw, df):
+    """Parsea agg=funcion:columna,... (count no requiere columna, pNN es un cuantil)"""
+    aggregates = []
+    for item in (raw or 'count').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        func, _, col = item.partition(':')
+        if func == 'count' and not col:
+            aggregates.append(('count', None, None))
+            continue
+        quantile = None
+        if func.startswith('p') and func[1:].isdigit():
+            quantile = int(func[1:]) / 100
+            if not 0 <= quantile <= 1:
+                raise ValueError(f"Cuantil fuera de rango: {func}")
+        elif func not in _QUERY_AGGREGATES:
+            raise ValueError(f"Agregado no válido: {func}. Opciones: {', '.join(_QUERY_AGGREGATES)}, pNN")
+        if col not in df.columns or not pd.api.types.is_numeric_dtype(df[col]):
+            raise ValueError(f"Columna numérica requerida para {func}: {col}")
+        aggregates.append((func, col, quantile))
+    return aggregates
+
+
+def run_query(dataset, args):
+    """Ejecuta filtro + agrupación + agregación vectorizada sobre el snapshot en cache"""
+    spec = _get_dataset(dataset)
+    df = spec['range_loader'](args) if 'range_loader' in spec else spec['loader']()
+    group_by = [k.strip() for k in (args.get('group_by') or '').split(',') if k.strip()]
+    aggregates = _parse_aggregates(args.get('agg'), df)
+
+    # Solo se materializan las columnas que la consulta necesita
+    needed = {spec['municipio'], spec['date']} | {col for _, col, _ in aggregates if col}
+    if spec['entidad']:
+        needed.add(spec['entidad'])
+    df = df.loc[_query_mask(df, spec, args), [c for c in df.columns if c in needed]]
+
+    results = {}
+    if group_by:
+        grouped = df.groupby(_query_group_keys(df, spec, group_by), sort=True, observed=True)
+        for func, col, quantile in aggregates:
+            if col is None:
+                results['count'] = grouped.size()
+            elif quantile is not None:
+                results[f'{func}_{col}'] = grouped[col].quantile(quantile)
+            else:
+                results[f'{func}_{col}'] = grouped[col].agg(func)
+        result = pd.DataFrame(results).reset_index()
+    else:
+        for func, col, quantile in aggregates:
+            if col is None:
+                results['count'] = len(df)
+            elif quantile is not None:
+                results[f'{func}_{col}'] = df[col].quantile(quantile)
+            else:
+                results[f'{func}_{col}'] = df[col].agg(func)
+        result = pd.DataFrame([results])
+
+    sort = args.get('sort')
+    if sort:
+        if sort not in result.columns:
+            raise ValueError(f"No se puede ordenar por {sort}")
+        result = result.sort_values(sort, ascending=args.get('order', 'asc') != 'desc')
+    limit = args.get('limit', type=int)
+    if limit and limit > 0:
+        result = result.head(limit)
+
+    result = result.replace([float('inf'), float('-inf')], None)
+    return result.astype(object).where(result.notna(), None)
+
+
+@app.route('/api/query', methods=['GET'])
+def query():
+    """Consulta genérica con filtros, agrupación y agregados calculados en el servidor.
+
+    Parámetros: dataset (radianza|pib), municipio/municipios, entidad, from, to, year,
+    filter=columna:operador:valor (repetible), group_by=municipio,entidad_federativa,year,month,
+    agg=funcion:columna,... (mean, sum, min, max, count, median, std, pNN), sort, order, limit.
+    """
+    try:
+        dataset = request.args.get('dataset', 'radianza')
+        try:
+            result = run_query(dataset, request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        data = result.to_dict('records')
+        return jsonify({
+            'success': True,
+            'dataset': dataset,
+            'data': data,
+            'total_records': len(data)
+        })
+    except Exception as e:
+        import traceback
+        error_msg = f"Error en query: {str(e)}\n{traceback.format_exc()}"
         print(error_msg)
         return jsonify({
             'success': False,
@@ -711,62 +3075,216 @@ def get_pib_years():
             'traceback': traceback.format_exc() if app.debug else None
         }), 500
 
-@app.route('/api/pib/municipio/<municipio>', methods=['GET'])
-def get_pib_municipio_data(municipio):
-    """Endpoint para obtener datos de PIB de un municipio específico"""
-    try:
-        df = get_pib_data().copy()
-        
-        if 'municipio' not in df.columns:
-            return jsonify({
-                'success': False,
-                'error': 'La columna "municipio" no existe en el CSV'
-            }), 500
-        
-        municipio_decoded = municipio.replace('%20', ' ').replace('+', ' ')
-        municipio_data = df[df['municipio'].str.lower() == municipio_decoded.lower()]
+# ==================== MATRIZ MUNICIPIO × PERIODO ====================
 
-        limit = request.args.get('limit', default=None, type=int)
-        from_date = request.args.get('from')
-        to_date = request.args.get('to')
-        year = request.args.get('year', type=int)
-        
-        if 'fecha' in municipio_data.columns:
-            if not pd.api.types.is_datetime64_any_dtype(municipio_data['fecha']):
-                municipio_data['fecha'] = pd.to_datetime(municipio_data['fecha'], errors='coerce')
-            municipio_data = municipio_data.sort_values('fecha')
-            if from_date:
-                municipio_data = municipio_data[municipio_data['fecha'] >= pd.to_datetime(from_date)]
-            if to_date:
-                municipio_data = municipio_data[municipio_data['fecha'] <= pd.to_datetime(to_date)]
-            if year:
-                municipio_data = municipio_data[municipio_data['fecha'].dt.year == year]
-        
-        if limit and limit > 0:
-            municipio_data = municipio_data.tail(limit)
-        
-        if municipio_data.empty:
-            return jsonify({
-                'success': False,
-                'error': f'Municipio {municipio_decoded} no encontrado'
-            }), 404
-        
-        if 'fecha' in municipio_data.columns and pd.api.types.is_datetime64_any_dtype(municipio_data['fecha']):
-            municipio_data['fecha'] = municipio_data['fecha'].dt.strftime('%Y-%m-%d')
-        
-        municipio_data = municipio_data.replace([float('inf'), float('-inf')], None)
-        municipio_data = municipio_data.fillna('')
-        
-        data = municipio_data.to_dict('records')
-        
-        return jsonify({
+# Matrices densas por (dataset, métrica, agregado, periodo), válidas mientras no cambie el snapshot
+_MATRICES = {}
+_MATRIX_AGGREGATES = ('mean', 'sum', 'min', 'max', 'count')
+_MATRIX_PERIODS = ('year', 'month')
+
+
+def _period_labels(keys, period):
+    if period == 'year':
+        return [int(k) for k in keys]
+    return [f'{int(k) // 100}-{int(k) % 100:02d}' for k in keys]
+
+
+def _streaming_year_table(metric, agg):
+    """Tabla municipio × año a partir de los agregados incrementales del modo streaming"""
+    acc = get_streaming_state()['by_municipio_year']
+    if metric not in acc['sum'].columns:
+        raise ValueError(f'Métrica no válida: {metric}')
+    if agg == 'mean':
+        series = acc[('sum', metric)] / acc[('count', metric)]
+    else:
+        series = acc[(agg, metric)]
+    return series.unstack('year'), None
+
+
+def _table_keys(df, spec, period):
+    """Filas válidas, claves de agrupación (municipio[, entidad], periodo) y columnas de fila"""
+    mun_col, date_col, ent_col = spec['municipio'], spec['date'], spec['entidad']
+    row_cols = [mun_col] + ([ent_col] if ent_col and ent_col in df.columns else [])
+    dates = df[date_col]
+    valid = dates.notna() & df[mun_col].notna()
+    # Periodo como entero (2020 o 202003) para agrupar sin formatear fechas fila a fila
+    period_key = dates.dt.year if period == 'year' else dates.dt.year * 100 + dates.dt.month
+    keys = [df.loc[valid, col].astype(str) for col in row_cols] + [period_key[valid].astype('int64').rename('period')]
+    return valid, keys, row_cols
+
+
+def _check_metric(df, metric):
+    if metric not in df.columns or not pd.api.types.is_numeric_dtype(df[metric]):
+        raise ValueError(f'Métrica no válida: {metric}')
+
+
+def _unstack_table(series, row_cols):
+    table = series.unstack('period')
+    if len(row_cols) == 1:
+        return table, None
+    return table.droplevel(1), table.index.get_level_values(1).tolist()
+
+
+def _frame_table(dataset, metric, agg, period):
+    """Tabla filas (municipio[, entidad]) × periodo agregando el snapshot completo"""
+    spec = DATASETS[dataset]
+    df = spec['loader']()
+    _check_metric(df, metric)
+    valid, keys, row_cols = _table_keys(df, spec, period)
+    return _unstack_table(df.loc[valid, metric].groupby(keys).agg(agg), row_cols)
+
+
+def _partitioned_table(metric, agg, period):
+    """Tabla municipio × periodo del layout particionado, agregando partición por partición.
+
+    Cada partición aporta suma, conteo, mínimo y máximo por (municipio, periodo); así nunca
+    se concatena el snapshot completo y la media sale exacta aunque un año abarque varias.
+    """
+    spec = DATASETS['radianza']
+    partials, row_cols = [], [spec['municipio']]
+    for part in list_radianza_partitions():
+        df = _load_partition(part)
+        _check_metric(df, metric)
+        valid, keys, row_cols = _table_keys(df, spec, period)
+        partials.append(df.loc[valid, metric].groupby(keys).agg(['sum', 'count', 'min', 'max']))
+    if not partials:
+        return pd.DataFrame(), None
+    combined = pd.concat(partials)
+    combined = combined.groupby(level=list(range(combined.index.nlevels))).agg(
+        {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'})
+    series = combined['sum'] / combined['count'] if agg == 'mean' else combined[agg]
+    return _unstack_table(series, row_cols)
+
+
+def get_matrix(dataset, metric, agg='mean', period='year'):
+    """Matriz densa municipio × periodo (float64, C-contigua) con etiquetas de filas y columnas.
+
+    Se calcula una vez por versión del snapshot; los filtros por entidad solo seleccionan filas.
+    """
+    dataset = (dataset or 'radianza').lower()
+    spec = _get_dataset(dataset)
+    if agg not in _MATRIX_AGGREGATES:
+        raise ValueError(f"Agregado no válido: {agg}. Opciones: {', '.join(_MATRIX_AGGREGATES)}")
+    if period not in _MATRIX_PERIODS:
+        raise ValueError(f"Periodo no válido: {period}. Opciones: {', '.join(_MATRIX_PERIODS)}")
+
+    streaming = dataset == 'radianza' and STREAMING_MODE
+    partitioned = dataset == 'radianza' and not STREAMING_MODE and BLOB_PREFIX
+    if streaming and period != 'year':
+        # Los agregados incrementales son por (municipio, año); por mes habría que materializar todo
+        raise ValueError('En modo streaming la matriz solo admite period=year')
+    if streaming:
+        version = get_streaming_state()['version']
+    elif partitioned:
+        version = _partitions_version(list_radianza_partitions())
+    else:
+        version = get_snapshot_version(dataset)
+    key = (dataset, metric, agg, period)
+    matrix = _MATRICES.get(key)
+    if matrix is not None and matrix['version'] == version:
+        MEMORY_BUDGET.touch('index', f'matrix:{":".join(key)}')
+        return matrix
+
+    started = time.perf_counter()
+    if streaming:
+        table, entidades = _streaming_year_table(metric, agg)
+    elif partitioned:
+        table, entidades = _partitioned_table(metric, agg, period)
+    else:
+        table, entidades = _frame_table(dataset, metric, agg, period)
+    table = table.reindex(columns=sorted(table.columns))
+    values = np.ascontiguousarray(table.to_numpy(dtype='float64', na_value=np.nan))
+    if agg == 'count':
+        values = np.nan_to_num(values, nan=0.0)
+    matrix = {
+        'version': version,
+        'rows': [str(m) for m in table.index],
+        'entidades': entidades,
+        'columns': _period_labels(table.columns, period),
+        'values': values,
+        'build_seconds': round(time.perf_counter() - started, 4),
+    }
+    _MATRICES[key] = matrix
+    MEMORY_BUDGET.register('index', f'matrix:{":".join(key)}', values.nbytes,
+                           evict=lambda: _MATRICES.pop(key, None))
+    return matrix
+
+
+def _matrix_rows(matrix, entidad):
+    """Posiciones de las filas a devolver (todas, o solo las de la entidad)"""
+    if not entidad:
+        return None
+    if matrix['entidades'] is None:
+        raise ValueError('Este dataset no tiene entidad_federativa')
+    wanted = normalize_name(entidad)
+    return np.array([i for i, e in enumerate(matrix['entidades']) if normalize_name(e) == wanted], dtype='int64')
+
+
+def _matrix_response(matrix, rows, fmt):
+    values = matrix['values'] if rows is None else matrix['values'][rows]
+    labels = matrix['rows'] if rows is None else [matrix['rows'][i] for i in rows]
+    entidades = matrix['entidades']
+    if entidades is not None and rows is not None:
+        entidades = [entidades[i] for i in rows]
+
+    if fmt == 'arrow':
+        df = pd.DataFrame(values, columns=[str(c) for c in matrix['columns']])
+        if entidades is not None:
+            df.insert(0, 'entidad_federativa', entidades)
+        df.insert(0, 'municipio', labels)
+        response = _arrow_response(df)
+    elif fmt == 'msgpack':
+        # Valores como bloque binario float64 little-endian, fila por fila (NaN = sin dato)
+        body = {
+            'rows': labels,
+            'entidades': entidades,
+            'columns': matrix['columns'],
+            'shape': list(values.shape),
+            'dtype': '<f8',
+            'values': np.ascontiguousarray(values, dtype='<f8').tobytes(),
+        }
+        response = Response(msgpack.packb(body), mimetype=MSGPACK_MIMETYPE)
+    else:
+        cells = [[None if v != v else v for v in row] for row in values.tolist()]
+        payload = {
             'success': True,
-            'data': data,
-            'municipio': municipio_decoded
-        })
+            'rows': labels,
+            'columns': matrix['columns'],
+            'values': cells,
+            'snapshot_version': matrix['version'],
+        }
+        if entidades is not None:
+            payload['entidades'] = entidades
+        return jsonify(payload)
+    response.headers['X-Snapshot-Version'] = matrix['version'] or ''
+    return response
+
+
+@app.route('/api/matrix', methods=['GET'])
+def get_matrix_endpoint():
+    """Matriz densa municipio × año/mes para heatmaps.
+
+    Parámetros: dataset (radianza|pib), metric, agg (mean, sum, min, max, count),
+    period (year|month), entidad (solo PIB) y format (json|arrow|msgpack).
+    """
+    try:
+        dataset = request.args.get('dataset', 'radianza')
+        try:
+            fmt = _negotiate_format()
+            spec = _get_dataset(dataset)
+            matrix = get_matrix(
+                dataset,
+                request.args.get('metric', spec['metric']),
+                request.args.get('agg', 'mean').lower(),
+                request.args.get('period', 'year').lower(),
+            )
+            rows = _matrix_rows(matrix, request.args.get('entidad_federativa') or request.args.get('entidad'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        return _matrix_response(matrix, rows, fmt)
     except Exception as e:
         import traceback
-        error_msg = f"Error en get_pib_municipio_data: {str(e)}\n{traceback.format_exc()}"
+        error_msg = f"Error en get_matrix_endpoint: {str(e)}\n{traceback.format_exc()}"
         print(error_msg)
         return jsonify({
             'success': False,
@@ -774,32 +3292,233 @@ def get_pib_municipio_data(municipio):
             'traceback': traceback.format_exc() if app.debug else None
         }), 500
 
-@app.route('/api/pib/stats', methods=['GET'])
-def get_pib_stats():
-    """Endpoint para obtener estadísticas de PIB"""
+# ==================== ANALÍTICA DE SERIES ====================
+
+# Snapshot ordenado por (municipio[, entidad], fecha): cada serie queda contigua y las
+# ventanas, rezagos y acumulados se calculan sobre arreglos planos con límites de serie
+_SERIES_VIEWS = {}
+_ANALYTICS_OPS = ('rolling_mean', 'rolling_sum', 'pop', 'yoy', 'cumsum')
+_MAX_ANALYTICS_WINDOW = 120
+
+
+def get_series_view(dataset):
+    """Vista por serie del snapshot con el inicio de la serie de cada fila.
+
+    Se construye una vez por versión; los resultados de cada operación se guardan en
+    la vista y se invalidan con ella.
+    """
+    spec = _get_dataset(dataset)
+    if dataset == 'radianza' and (STREAMING_MODE or BLOB_PREFIX):
+        # La vista ordena el snapshot completo en memoria, justo lo que esos modos evitan
+        raise ValueError('El análisis por serie no está disponible en modo streaming '
+                         'ni con layout particionado: requiere el snapshot completo en memoria')
+    df = spec['loader']()
+    version = _SNAPSHOT_VERSIONS.get(dataset)
+    view = _SERIES_VIEWS.get(dataset)
+    if view is not None and view['version'] == version:
+        MEMORY_BUDGET.touch('index', f'series:{dataset}')
+        return view
+    if view is not None:
+        for result_key in list(view['results']):
+            MEMORY_BUDGET.unregister('cache', _analytics_cache_key(dataset, result_key))
+
+    date_col, mun_col, ent_col = spec['date'], spec['municipio'], spec['entidad']
+    group_cols = [mun_col] + ([ent_col] if ent_col and ent_col in df.columns else [])
+    sorted_df = (df.dropna(subset=[date_col, mun_col])
+                 .sort_values(group_cols + [date_col], kind='mergesort')
+                 .reset_index(drop=True))
+    # Con el orden por serie, ngroup sin ordenar numera las series en orden creciente
+    codes = sorted_df.groupby(group_cols, sort=False).ngroup().to_numpy(dtype='int64')
+    n = len(sorted_df)
+    group_starts = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1)) if n else np.array([], dtype='int64')
+    starts = np.repeat(group_starts, np.diff(np.append(group_starts, n)))
+    previous_year = _previous_year_positions(codes, starts, sorted_df[date_col])
+    view = {
+        'version': version,
+        'df': sorted_df,
+        'group_cols': group_cols,
+        'codes': codes,
+        'starts': starts,
+        'previous_year': previous_year,
+        'results': {},
+    }
+    _SERIES_VIEWS[dataset] = view
+    MEMORY_BUDGET.register('index', f'series:{dataset}',
+                           frame_nbytes(sorted_df, deep=False) + codes.nbytes + starts.nbytes + previous_year.nbytes,
+                           evict=lambda: _SERIES_VIEWS.pop(dataset, None))
+    return view
+
+
+def _previous_year_positions(codes, starts, dates):
+    """Fila de la misma serie un año antes (-1 si no hay) para cada fila de la vista.
+
+    Con a lo sumo un dato por mes en cada serie se empareja por (serie, año, mes), sin
+    importar el día. Si no, se toma el último dato en o antes de la misma fecha del año
+    anterior (el 29 de febrero busca desde el 28), y solo vale si cae en el mismo mes de
+    ese año: sin dato en ese mes el cambio queda NaN en vez de compararse con uno viejo.
+    """
+    n = len(codes)
+    if not n:
+        return np.array([], dtype='int64')
+    years = dates.dt.year.to_numpy(dtype='int64')
+    months = dates.dt.month.to_numpy(dtype='int64')
+    # Claves crecientes en el orden de la vista (serie, luego fecha)
+    month_key = codes * 1_000_000 + years * 100 + months
+    if n < 2 or (np.diff(month_key) > 0).all():
+        target = month_key - 100
+        found = np.minimum(np.searchsorted(month_key, target), n - 1)
+        return np.where(month_key[found] == target, found, -1)
+    days = dates.to_numpy(dtype='datetime64[D]').astype('int64')
+    target_days = (dates - pd.DateOffset(years=1)).to_numpy(dtype='datetime64[D]').astype('int64')
+    base = int(target_days.min())
+    span = int(days.max()) - base + 1
+    day_key = codes * span + (days - base)
+    found = np.searchsorted(day_key, codes * span + (target_days - base), side='right') - 1
+    # Solo cuenta si el dato encontrado es de la misma serie y del mismo mes un año antes
+    same_month = month_key[np.maximum(found, 0)] == month_key - 100
+    return np.where((found >= starts) & same_month, found, -1)
+
+
+def _analytics_cache_key(dataset, result_key):
+    metric, op, window = result_key
+    return f'analytics:{dataset}:{metric}:{op}' + (f':{window}' if window else '')
+
+
+def parse_analytics_ops(value):
+    """'rolling_mean:3,yoy,cumsum' -> [('rolling_mean', 3), ('yoy', None), ('cumsum', None)]"""
+    ops = []
+    for item in (value or 'yoy').split(','):
+        name, _, window = item.strip().lower().partition(':')
+        if name not in _ANALYTICS_OPS:
+            raise ValueError(f"Operación no válida: {name}. Opciones: {', '.join(_ANALYTICS_OPS)}")
+        if name.startswith('rolling_'):
+            if not window.isdigit() or not 1 <= int(window) <= _MAX_ANALYTICS_WINDOW:
+                raise ValueError(f'{name} requiere una ventana entre 1 y {_MAX_ANALYTICS_WINDOW}, p. ej. {name}:3')
+            ops.append((name, int(window)))
+        else:
+            ops.append((name, None))
+    return ops
+
+
+def _change_pct(values, previous):
+    """Cambio porcentual; sin periodo previo o con base 0 queda NaN"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (values - previous) / np.abs(previous) * 100
+    change[~np.isfinite(change)] = np.nan
+    return change
+
+
+def compute_series_op(dataset, view, metric, op, window=None):
+    """Una operación sobre todas las series a la vez (sin recorrer municipios en Python)"""
+    result_key = (metric, op, window)
+    cached = view['results'].get(result_key)
+    if cached is not None:
+        return cached
+
+    values = view['df'][metric].to_numpy(dtype='float64', na_value=np.nan)
+    starts = view['starts']
+    n = len(values)
+    positions = np.arange(n)
+    if op in ('rolling_mean', 'rolling_sum'):
+        # Ventanas de `window` filas; solo valen las que no cruzan el inicio de la serie
+        # y, como en pandas rolling(window), un nulo en la ventana da nulo
+        result = np.full(n, np.nan)
+        if n >= window:
+            windows = np.lib.stride_tricks.sliding_window_view(values, window)
+            reduced = windows.mean(axis=1) if op == 'rolling_mean' else windows.sum(axis=1)
+            last = positions[window - 1:]
+            full = last - window + 1 >= starts[window - 1:]
+            result[last[full]] = reduced[full]
+    elif op == 'pop':
+        previous = np.full(n, np.nan)
+        has_previous = positions > starts
+        previous[has_previous] = values[positions[has_previous] - 1]
+        result = _change_pct(values, previous)
+    elif op == 'yoy':
+        found = view['previous_year']
+        previous = np.where(found >= 0, values[found], np.nan) if n else values
+        result = _change_pct(values, previous)
+    else:
+        result = pd.Series(values).groupby(view['codes']).cumsum().to_numpy()
+
+    view['results'][result_key] = result
+    MEMORY_BUDGET.register('cache', _analytics_cache_key(dataset, result_key), result.nbytes,
+                           evict=lambda: view['results'].pop(result_key, None))
+    return result
+
+
+def run_analytics(dataset, args):
+    """Métrica y columnas calculadas para las series pedidas, con filtros aplicados al final"""
+    dataset = (dataset or 'radianza').lower()
+    spec = _get_dataset(dataset)
+    view = get_series_view(dataset)
+    df = view['df']
+    metric = args.get('metric', spec['metric'])
+    if metric not in df.columns or not pd.api.types.is_numeric_dtype(df[metric]):
+        raise ValueError(f'Métrica no válida: {metric}')
+    ops = parse_analytics_ops(args.get('ops'))
+
+    columns = {col: df[col] for col in view['group_cols'] + [spec['date'], metric]}
+    for op, window in ops:
+        name = f'{metric}_{op}' + (f'_{window}' if window else '')
+        columns[name] = compute_series_op(dataset, view, metric, op, window)
+    result = pd.DataFrame(columns)
+
+    # Los filtros se aplican después de calcular: las ventanas usan la historia previa al rango
+    mask = np.ones(len(result), dtype=bool)
+    municipios = [m for value in args.getlist('municipios') for m in value.split(',') if m.strip()]
+    if args.get('municipio'):
+        municipios.append(args.get('municipio'))
+    if municipios:
+        mask &= result[spec['municipio']].str.lower().isin({m.strip().lower() for m in municipios}).to_numpy()
+    entidad = args.get('entidad_federativa') or args.get('entidad')
+    if entidad:
+        if spec['entidad'] not in view['group_cols']:
+            raise ValueError('Este dataset no tiene entidad_federativa')
+        mask &= (result[spec['entidad']].map(normalize_name) == normalize_name(entidad)).to_numpy()
+    start, end = date_bounds(args)
+    if start is not None:
+        mask &= (result[spec['date']] >= start).to_numpy()
+    if end is not None:
+        mask &= (result[spec['date']] <= end).to_numpy()
+    return result[mask], view['version']
+
+
+@app.route('/api/analytics', methods=['GET'])
+def get_analytics():
+    """Medias móviles, cambio interanual / entre periodos y acumulados por serie.
+
+    Parámetros: dataset (radianza|pib), metric, ops=rolling_mean:N,rolling_sum:N,pop,yoy,cumsum
+    (pop y yoy en %), municipio/municipios, entidad, from, to, year y format (json|arrow|msgpack).
+    """
     try:
-        df = get_pib_data().copy()
-        
-        # Estadísticas generales
-        general_stats = {
-            'total_records': len(df),
-            'total_municipios': df['municipio'].nunique() if 'municipio' in df.columns else 0,
-            'total_entidades': df['entidad_federativa'].nunique() if 'entidad_federativa' in df.columns else 0,
-            'fecha_min': str(df['fecha'].min()) if 'fecha' in df.columns else 'N/A',
-            'fecha_max': str(df['fecha'].max()) if 'fecha' in df.columns else 'N/A',
-            'pib_mun_promedio': float(df['pib_mun'].mean()) if 'pib_mun' in df.columns else 0.0,
-            'pib_mun_maximo': float(df['pib_mun'].max()) if 'pib_mun' in df.columns else 0.0,
-            'pib_mun_minimo': float(df['pib_mun'].min()) if 'pib_mun' in df.columns else 0.0,
-            'pibe_promedio': float(df['pibe'].mean()) if 'pibe' in df.columns else 0.0
-        }
-        
+        try:
+            fmt = _negotiate_format()
+            df, version = run_analytics(request.args.get('dataset', 'radianza'), request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        if fmt != 'json':
+            response = _binary_response(df, fmt)
+            response.headers['X-Snapshot-Version'] = version or ''
+            return response
+
+        df = df.copy()
+        for col in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = df[col].dt.strftime('%Y-%m-%d')
+        # Sin dato (inicio de serie, ventana incompleta) -> null
+        df = df.astype(object).where(df.notna(), None)
+        data = df.to_dict('records')
         return jsonify({
             'success': True,
-            'general': general_stats
+            'data': data,
+            'total_records': len(data),
+            'snapshot_version': version
         })
     except Exception as e:
         import traceback
-        error_msg = f"Error en get_pib_stats: {str(e)}\n{traceback.format_exc()}"
+        error_msg = f"Error en get_analytics: {str(e)}\n{traceback.format_exc()}"
         print(error_msg)
         return jsonify({
             'success': False,
@@ -807,85 +3526,163 @@ def get_pib_stats():
             'traceback': traceback.format_exc() if app.debug else None
         }), 500
 
-@app.route('/api/pib/download', methods=['GET'])
-def download_pib_data():
-    """Endpoint para descargar datos de PIB filtrados como CSV"""
+# ==================== RANKINGS POR TENDENCIA ====================
+
+# Promedio, pendiente lineal y CAGR de todas las series en una sola pasada vectorizada
+# (np.bincount por código de serie). Los rangos comunes se precalculan por versión.
+_RANKING_MODES = ('mean', 'slope', 'cagr')
+_RANKING_VALUE_COLUMNS = {'mean': 'promedio', 'slope': 'pendiente', 'cagr': 'cagr'}
+_TREND_COMMON_YEARS = (None, 5, 10)  # Toda la historia y los últimos 5 y 10 años
+_TREND_CACHE = {}
+_TREND_LOCK = threading.Lock()
+
+
+def compute_rankings(view, spec, labels, metric, mode, start=None, end=None):
+    """Valor por serie en [start, end]: promedio, pendiente (unidades/año) o CAGR (%)"""
+    df = view['df']
+    if metric not in df.columns or not pd.api.types.is_numeric_dtype(df[metric]):
+        raise ValueError(f'Métrica no válida: {metric}')
+    values = df[metric].to_numpy(dtype='float64', na_value=np.nan)
+    dates = df[spec['date']].to_numpy(dtype='datetime64[ns]')
+    mask = ~np.isnan(values)
+    if start is not None:
+        mask &= dates >= start.to_datetime64()
+    if end is not None:
+        mask &= dates <= end.to_datetime64()
+    codes, y = view['codes'][mask], values[mask]
+    # Tiempo en años (fraccionarios) para que la pendiente quede en unidades por año
+    t = dates[mask].astype('datetime64[D]').astype('int64') / 365.2425
+    n_groups = len(labels)
+    counts = np.bincount(codes, minlength=n_groups)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if mode == 'mean':
+            value = np.bincount(codes, y, n_groups) / counts
+        elif mode == 'slope':
+            # Mínimos cuadrados en forma cerrada: sum((t - t̄)(y - ȳ)) / sum((t - t̄)²)
+            mean_t = np.bincount(codes, t, n_groups) / counts
+            mean_y = np.bincount(codes, y, n_groups) / counts
+            dt = t - mean_t[codes]
+            value = np.bincount(codes, dt * (y - mean_y[codes]), n_groups) / np.bincount(codes, dt * dt, n_groups)
+            value[counts < 2] = np.nan
+        else:
+            # Filas ordenadas por (serie, fecha): primera y última observación de cada serie
+            value = np.full(n_groups, np.nan)
+            if len(codes):
+                first = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+                last = np.r_[first[1:] - 1, len(codes) - 1]
+                growth = np.power(y[last] / y[first], 1 / (t[last] - t[first])) - 1
+                value[codes[first]] = growth * 100
+    value[~np.isfinite(value)] = np.nan
+
+    ranking = labels.copy()
+    ranking[_RANKING_VALUE_COLUMNS[mode]] = value
+    ranking['puntos'] = counts
+    return ranking.dropna(subset=[_RANKING_VALUE_COLUMNS[mode]]).sort_values(
+        _RANKING_VALUE_COLUMNS[mode], ascending=False, kind='mergesort').reset_index(drop=True)
+
+
+def _trend_state(dataset):
+    """Etiquetas de series y rankings calculados para la versión vigente del snapshot"""
+    view = get_series_view(dataset)
+    with _TREND_LOCK:
+        state = _TREND_CACHE.get(dataset)
+        if state is not None and state['version'] == view['version']:
+            return view, state
+        spec = DATASETS[dataset]
+        starts = np.flatnonzero(np.r_[True, view['codes'][1:] != view['codes'][:-1]]) if len(view['codes']) else []
+        dates = view['df'][spec['date']]
+        state = {
+            'version': view['version'],
+            'labels': view['df'][view['group_cols']].iloc[starts].reset_index(drop=True),
+            'last_year': int(dates.max().year) if len(dates) else None,
+            'rankings': {},
+        }
+        _TREND_CACHE[dataset] = state
+    # Precalcular los rangos comunes sin bloquear la petición que detectó la versión nueva
+    threading.Thread(target=_precompute_rankings, args=(dataset, view, state),
+                     name=f'trends-{dataset}', daemon=True).start()
+    return view, state
+
+
+def _ranking_bounds(state, args):
+    """years=N (últimos N años del snapshot) o from/to/year"""
+    years = args.get('years', type=int)
+    if years is not None:
+        if years < 1:
+            raise ValueError('years debe ser mayor que 0')
+        if state['last_year'] is not None:
+            args = MultiDict({'from': f"{state['last_year'] - years + 1}-01-01",
+                              'to': f"{state['last_year']}-12-31"})
+    return date_bounds(args)
+
+
+def _ranking(dataset, view, state, metric, mode, start, end):
+    key = (metric, mode, start, end)
+    ranking = state['rankings'].get(key)
+    if ranking is None:
+        ranking = compute_rankings(view, DATASETS[dataset], state['labels'], metric, mode, start, end)
+        state['rankings'][key] = ranking
+        MEMORY_BUDGET.register('cache', f'rankings:{dataset}',
+                               sum(frame_nbytes(r) for r in list(state['rankings'].values())),
+                               evict=lambda: state['rankings'].clear())
+    return ranking
+
+
+def _precompute_rankings(dataset, view, state):
     try:
-        df = get_pib_data().copy()
-        
-        # Aplicar los mismos filtros que en /api/pib/data
-        municipio = request.args.get('municipio')
-        municipios = request.args.getlist('municipios')  # Lista de municipios
-        from_date = request.args.get('from')
-        to_date = request.args.get('to')
-        columns = request.args.get('columns')
-        
-        # Filtro por municipio(s)
-        if municipios:
-            if 'municipio' in df.columns:
-                df = df[df['municipio'].str.lower().isin([m.lower() for m in municipios])]
-        elif municipio and 'municipio' in df.columns:
-            df = df[df['municipio'].str.lower() == municipio.lower()]
-        
-        # Filtros de fecha
-        if 'fecha' in df.columns:
-            if not pd.api.types.is_datetime64_any_dtype(df['fecha']):
-                df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-            
-            if from_date:
-                df = df[df['fecha'] >= pd.to_datetime(from_date)]
-            if to_date:
-                df = df[df['fecha'] <= pd.to_datetime(to_date)]
-            
-            # Ordenar por fecha
-            df = df.sort_values('fecha')
-        
-        # Selección de columnas - solo PIB municipal
-        # Incluir solo: fecha, municipio, entidad_federativa, pib_mun
-        pib_mun_columns = ['fecha', 'municipio', 'entidad_federativa', 'pib_mun']
-        available_columns = [col for col in pib_mun_columns if col in df.columns]
-        if available_columns:
-            df = df[available_columns]
-        
-        # Convertir fechas a string formato legible
-        if 'fecha' in df.columns and pd.api.types.is_datetime64_any_dtype(df['fecha']):
-            df['fecha'] = df['fecha'].dt.strftime('%Y-%m-%d')
-        
-        # Reemplazar NaN y valores infinitos
-        df = df.replace([float('inf'), float('-inf')], '')
-        df = df.fillna('')
-        
-        # Convertir DataFrame a CSV
-        output = StringIO()
-        df.to_csv(output, index=False, encoding='utf-8-sig')  # utf-8-sig para Excel
-        output.seek(0)
-        
-        # Generar nombre de archivo
-        filename = 'datos_pib'
-        if municipios:
-            filename += f"_{len(municipios)}_municipios"
-        elif municipio:
-            filename += f"_{municipio.replace(' ', '_')}"
-        filename += '.csv'
-        
-        # Crear respuesta con headers apropiados para descarga
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Content-Type': 'text/csv; charset=utf-8-sig'
-            }
-        )
+        metric = DATASETS[dataset]['metric']
+        for years in _TREND_COMMON_YEARS:
+            start, end = _ranking_bounds(state, MultiDict({'years': years} if years else {}))
+            for mode in _RANKING_MODES:
+                _ranking(dataset, view, state, metric, mode, start, end)
     except Exception as e:
-        import traceback
-        error_msg = f"Error en download_pib_data: {str(e)}\n{traceback.format_exc()}"
-        print(error_msg)
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'traceback': traceback.format_exc() if app.debug else None
-        }), 500
+        print(f"Error al precalcular rankings de {dataset}: {e}")
+
+
+def get_ranking(dataset, args):
+    """Ranking top/bottom N por promedio, pendiente o CAGR, opcionalmente por entidad"""
+    dataset = (dataset or 'radianza').lower()
+    spec = _get_dataset(dataset)
+    if dataset == 'radianza' and (STREAMING_MODE or BLOB_PREFIX):
+        # Pendiente y CAGR necesitan cada observación por serie; esos modos no tienen el
+        # snapshot en memoria y los agregados por (municipio, año) cambiarían el resultado
+        raise ValueError('Los rankings por tendencia de radianza no están disponibles en modo streaming '
+                         'ni con layout particionado; usa /api/comparison con metric, top y year')
+    mode = args.get('mode', 'mean').lower()
+    if mode not in _RANKING_MODES:
+        raise ValueError(f"Modo no válido: {mode}. Opciones: {', '.join(_RANKING_MODES)}")
+    order = args.get('order', 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError('order debe ser asc o desc')
+    metric = args.get('metric', spec['metric'])
+    top_n = args.get('top', default=10, type=int)
+
+    view, state = _trend_state(dataset)
+    start, end = _ranking_bounds(state, args)
+    ranking = _ranking(dataset, view, state, metric, mode, start, end)
+
+    entidad = args.get('entidad_federativa') or args.get('entidad')
+    if entidad:
+        if spec['entidad'] not in ranking.columns:
+            raise ValueError('Este dataset no tiene entidad_federativa')
+        ranking = ranking[ranking[spec['entidad']].map(normalize_name) == normalize_name(entidad)]
+    # El ranking ya está ordenado de mayor a menor: bottom N = últimas N filas invertidas
+    ranking = ranking.head(top_n) if order == 'desc' else ranking.iloc[::-1].head(top_n)
+
+    value_col = _RANKING_VALUE_COLUMNS[mode]
+    ranking = ranking.copy()
+    ranking[value_col] = ranking[value_col].round(4 if mode == 'slope' else 2)
+    ranking['puntos'] = ranking['puntos'].astype(int)
+    return {
+        'data': ranking.to_dict('records'),
+        'mode': mode,
+        'metric': metric,
+        'order': order,
+        'from': str(start.date()) if start is not None else None,
+        'to': str(end.date()) if end is not None else None,
+        'snapshot_version': state['version'],
+    }
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -909,7 +3706,14 @@ def chart_data():
     """Endpoint para datos de gráfica (compatibilidad con frontend antiguo)"""
     try:
         # Intentar obtener datos reales del blob storage
-        df = get_blob_data()
+        if STREAMING_MODE:
+            # Los 7 registros más recientes están en el último año: solo se escanea ese rango
+            state = get_streaming_state()
+            years = state['by_municipio_year'].index.get_level_values('year')
+            start = pd.Timestamp(year=int(years.max()), month=1, day=1) if len(years) else None
+            df = scan_spill(state, start)
+        else:
+            df = get_blob_data()
         
         # Si hay datos de fecha, usar los últimos 7 registros
         if 'Fecha' in df.columns and len(df) > 0:
@@ -979,17 +3783,30 @@ def chart_data():
 def debug_info():
     """Endpoint de debug para verificar la conexión y estructura del CSV"""
     try:
-        df = get_blob_data()
-        
+        if STREAMING_MODE:
+            frame_info = spill_summary(get_streaming_state())
+        else:
+            df = get_blob_data()
+            frame_info = {
+                'columns': list(df.columns),
+                'shape': df.shape,
+                'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
+                'sample_data': df.head(3).to_dict('records') if len(df) > 0 else [],
+                'null_counts': df.isnull().sum().to_dict(),
+            }
+
         debug_info = {
             'success': True,
-            'columns': list(df.columns),
-            'shape': df.shape,
-            'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
-            'sample_data': df.head(3).to_dict('records') if len(df) > 0 else [],
-            'null_counts': df.isnull().sum().to_dict(),
+            **frame_info,
+            'ingest': _INGEST_STATS,
+            'exports': _EXPORT_STATS,
+            'admission': {name: lane.snapshot() for name, lane in _ADMISSION_LANES.items()},
+            'memory': MEMORY_BUDGET.report(),
+            'startup': _STARTUP_STATS,
+            'compute': _COMPUTE_STATS,
         'static_folder': app.static_folder,
-            'static_folder_exists': os.path.exists(app.static_folder) if app.static_folder else False
+            'static_folder_exists': _STATIC_FOLDER_EXISTS,
+            'static_manifest_files': len(_STATIC_MANIFEST)
         }
         
         return jsonify(debug_info)
@@ -1001,10 +3818,201 @@ def debug_info():
             'traceback': traceback.format_exc()
         }), 500
 
+# ==================== COMPRESIÓN ====================
+
+# Tipos de contenido que vale la pena comprimir (Parquet ya viene comprimido)
+_COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'text/csv',
+    'text/html',
+    'text/css',
+    'text/javascript',
+    'application/javascript',
+    'image/svg+xml',
+    ARROW_MIMETYPE,
+    MSGPACK_MIMETYPE,
+}
+_STREAM_CHUNK_BYTES = 64 * 1024
+
+_IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _negotiate_encoding():
+    """Elige br o gzip según Accept-Encoding (None si el cliente no acepta ninguno)"""
+    return request.accept_encodings.best_match(['br', 'gzip'])
+
+
+def _compress_bytes(data, encoding, static=False):
+    """Comprime en memoria; los assets estáticos usan el nivel máximo"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if static else COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if static else COMPRESSION_GZIP_LEVEL)
+
+
+def _compress_stream(chunks, encoding):
+    """Comprime un iterable de bytes bloque a bloque sin acumular la respuesta completa"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        for chunk in chunks:
+            out = compressor.process(chunk)
+            if out:
+                yield out
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = formato gzip
+        for chunk in chunks:
+            out = compressor.compress(chunk)
+            if out:
+                yield out
+        yield compressor.flush()
+
+
+def _iter_chunks(source):
+    """Re-corta un iterable de bytes en bloques acotados"""
+    for chunk in source:
+        for start in range(0, len(chunk), _STREAM_CHUNK_BYTES):
+            yield chunk[start:start + _STREAM_CHUNK_BYTES]
+
+
+@app.after_request
+def compress_response(response):
+    """Compresión negociada (br/gzip) para respuestas de API y descargas"""
+    if (response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in _COMPRESSIBLE_MIMETYPES
+            or not request.path.startswith('/api/')):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _negotiate_encoding()
+    if encoding is None:
+        return response
+
+    is_download = 'attachment' in response.headers.get('Content-Disposition', '')
+    if is_download or response.direct_passthrough or response.is_streamed:
+        # Modo streaming para descargas: se comprime por bloques y sin Content-Length
+        length = response.calculate_content_length()
+        if length is not None and length < COMPRESSION_MIN_BYTES:
+            return response
+        source = response.iter_encoded()
+        response.direct_passthrough = False
+        response.response = _compress_stream(_iter_chunks(source), encoding)
+        response.headers.pop('Content-Length', None)
+        response.headers.pop('Accept-Ranges', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_BYTES:
+            return response
+        response.set_data(_compress_bytes(data, encoding))
+
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak=True)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+# ==================== ARCHIVOS ESTÁTICOS ====================
+
+# Manifiesto en memoria del build de React, construido una vez al arrancar:
+# {ruta: {'variants': {'identity'|'br'|'gzip': (bytes, headers)}, 'etag': str}}
+# Los archivos grandes (p. ej. imágenes pesadas) se quedan en disco con 'on_disk'.
+_STATIC_MANIFEST = {}
+_STATIC_FOLDER_EXISTS = False
+_STATIC_MAX_IN_MEMORY_BYTES = 5 * 1024 * 1024
+
+
+def _static_cache_control(path):
+    """Los assets de Vite llevan hash en el nombre: se pueden cachear para siempre"""
+    return _IMMUTABLE_CACHE_CONTROL if path.startswith('assets/') else 'no-cache'
+
+
+def _build_static_manifest():
+    """Lee frontend/dist una sola vez: contenido, ETag por hash y headers precalculados.
+
+    Los assets de texto se precomprimen (br/gzip al nivel máximo) en el mismo paso.
+    """
+    global _STATIC_FOLDER_EXISTS
+    _STATIC_MANIFEST.clear()
+    _STATIC_FOLDER_EXISTS = bool(app.static_folder) and os.path.isdir(app.static_folder)
+    if not _STATIC_FOLDER_EXISTS:
+        return
+    started = time.perf_counter()
+    original_bytes = compressed_bytes = 0
+    for root, _, files in os.walk(app.static_folder):
+        for name in files:
+            full_path = os.path.join(root, name)
+            rel_path = os.path.relpath(full_path, app.static_folder).replace(os.sep, '/')
+            if os.path.getsize(full_path) > _STATIC_MAX_IN_MEMORY_BYTES:
+                _STATIC_MANIFEST[rel_path] = {'on_disk': True}
+                continue
+            with open(full_path, 'rb') as fh:
+                data = fh.read()
+
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            digest = hashlib.sha256(data).hexdigest()[:20]
+            base_headers = {
+                'Content-Type': get_content_type(mimetype, 'utf-8'),
+                'Cache-Control': _static_cache_control(rel_path),
+            }
+            contents = {'identity': data}
+            if mimetype in _COMPRESSIBLE_MIMETYPES and len(data) >= COMPRESSION_MIN_BYTES:
+                for encoding in ('br', 'gzip'):
+                    compressed = _compress_bytes(data, encoding, static=True)
+                    if len(compressed) < len(data):
+                        contents[encoding] = compressed
+            if len(contents) > 1:
+                base_headers['Vary'] = 'Accept-Encoding'
+                original_bytes += len(data)
+                compressed_bytes += min(len(v) for k, v in contents.items() if k != 'identity')
+
+            variants = {}
+            for encoding, body in contents.items():
+                headers = dict(base_headers)
+                headers['Content-Length'] = str(len(body))
+                if encoding == 'identity':
+                    headers['ETag'] = f'"{digest}"'
+                else:
+                    headers['ETag'] = f'"{digest}-{encoding}"'
+                    headers['Content-Encoding'] = encoding
+                variants[encoding] = (body, headers)
+            _STATIC_MANIFEST[rel_path] = {'variants': variants}
+    MEMORY_BUDGET.register('static', 'manifest', sum(
+        len(body) for entry in _STATIC_MANIFEST.values()
+        for body, _ in entry.get('variants', {}).values()
+    ))
+    print(f"Manifiesto estático: {len(_STATIC_MANIFEST)} archivos, precomprimidos "
+          f"{original_bytes / 1024:.1f} KB -> {compressed_bytes / 1024:.1f} KB "
+          f"en {time.perf_counter() - started:.2f}s")
+
+
+def _send_static(path):
+    """Sirve un archivo del manifiesto sin tocar el disco (304 si el ETag coincide)"""
+    entry = _STATIC_MANIFEST[path]
+    if entry.get('on_disk'):
+        response = send_from_directory(app.static_folder, path)
+        response.headers['Cache-Control'] = _static_cache_control(path)
+        return response
+
+    variants = entry['variants']
+    encoding = 'identity'
+    if len(variants) > 1:
+        encoding = request.accept_encodings.best_match(
+            [e for e in ('br', 'gzip') if e in variants], default='identity'
+        )
+    body, headers = variants[encoding]
+    if request.if_none_match.contains(headers['ETag'].strip('"')):
+        return Response(status=304, headers={k: v for k, v in headers.items()
+                                             if k not in ('Content-Length', 'Content-Type')})
+    return Response(body, headers=headers)
+
+
+if not _IN_COMPUTE_WORKER:
+    _build_static_manifest()
+
 # Ruta para servir el index.html de React
 @app.route('/')
 def index():
-    if not os.path.exists(app.static_folder):
+    if 'index.html' not in _STATIC_MANIFEST:
         return jsonify({
             'status': 'ok',
             'service': 'Radianza API',
@@ -1016,30 +4024,14 @@ def index():
                 'stats': '/api/stats',
                 'comparison': '/api/comparison',
                 'download': '/api/download',
+                'query': '/api/query',
                 'debug': '/api/debug'
             },
-            'note': 'Frontend not built, serving API only'
+            'note': ('index.html not found, serving API only' if _STATIC_FOLDER_EXISTS
+                     else 'Frontend not built, serving API only')
         })
     
-    index_path = os.path.join(app.static_folder, 'index.html')
-    if not os.path.exists(index_path):
-        return jsonify({
-            'status': 'ok',
-            'service': 'Radianza API',
-            'endpoints': {
-                'health': '/api/health',
-                'data': '/api/data',
-                'years': '/api/years',
-                'municipios': '/api/municipios',
-                'stats': '/api/stats',
-                'comparison': '/api/comparison',
-                'download': '/api/download',
-                'debug': '/api/debug'
-            },
-            'note': 'index.html not found, serving API only'
-        })
-    
-    return send_from_directory(app.static_folder, 'index.html')
+    return _send_static('index.html')
 
 # Ruta catch-all para servir archivos estáticos y React Router
 @app.route('/<path:path>')
@@ -1048,19 +4040,24 @@ def serve(path):
     if path.startswith('api/'):
         return jsonify({'error': 'Not found'}), 404
     
-    # Servir archivos estáticos si existen
-    file_path = os.path.join(app.static_folder, path)
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        return send_from_directory(app.static_folder, path)
+    # Servir archivos estáticos desde el manifiesto en memoria
+    if path in _STATIC_MANIFEST:
+        return _send_static(path)
     
     # Para cualquier otra ruta, servir index.html (para React Router)
-    if os.path.exists(app.static_folder):
-        index_path = os.path.join(app.static_folder, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(app.static_folder, 'index.html')
+    if 'index.html' in _STATIC_MANIFEST:
+        return _send_static('index.html')
     
     return jsonify({'error': 'Not found'}), 404
 
+# Arranque: la pila de datos se importa al inicio (eager), en segundo plano mientras el
+# servidor ya atiende peticiones (background, default) o en el primer uso (lazy)
+_STARTUP_STATS['module_import_seconds'] = round(time.perf_counter() - _MODULE_IMPORT_STARTED, 4)
+if STARTUP_MODE == 'eager':
+    warm_heavy_imports()
+elif STARTUP_MODE == 'background' and not _IN_COMPUTE_WORKER:
+    threading.Thread(target=warm_heavy_imports, name='warmup', daemon=True).start()
+
 if __name__ == '__main__':
     # Configuración para desarrollo local
     # En producción, usar gunicorn (ver Dockerfile CMD)
@@ -0,0 +1,91 @@
+"""
+Benchmark de arranque: tiempo de import de app.py y tiempo desde el arranque del
+servidor hasta la primera respuesta de /api/health, para cada STARTUP_MODE.
+
+Uso:
+    python bench_startup.py [--runs 5] [--modes eager,lazy,background]
+"""
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+IMPORT_SNIPPET = (
+    "import time, sys; t = time.perf_counter(); import app; "
+    "print(f'{time.perf_counter() - t:.4f} {len(sys.modules)}')"
+)
+
+
+def _env(mode):
+    env = dict(os.environ, STARTUP_MODE=mode, PYTHONDONTWRITEBYTECODE='1')
+    # Sin credenciales reales la app arranca igual (solo fallan los endpoints de datos)
+    env.setdefault('STORAGE_ACCOUNT_KEY', 'benchmark')
+    return env
+
+
+def measure_import(mode):
+    """Segundos de `import app` y módulos cargados, en un proceso limpio"""
+    out = subprocess.run(
+        [sys.executable, '-c', IMPORT_SNIPPET],
+        cwd=ROOT, env=_env(mode), capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    seconds, modules = out.split()
+    return float(seconds), int(modules)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_health(mode, timeout=30.0):
+    """Segundos desde lanzar el servidor hasta el primer 200 de /api/health"""
+    port = _free_port()
+    if shutil.which('gunicorn'):
+        cmd = ['gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', '1', '--threads', '8', 'app:app']
+    else:
+        cmd = [sys.executable, 'app.py']
+    env = _env(mode)
+    env['PORT'] = str(port)
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f'http://127.0.0.1:{port}/api/health'
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError(f'/api/health no respondió en {timeout}s (modo {mode})')
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--modes', default='eager,lazy,background')
+    args = parser.parse_args()
+
+    print(f"{'modo':<12}{'import (ms)':>14}{'módulos':>10}{'boot->health (ms)':>20}")
+    for mode in args.modes.split(','):
+        imports = [measure_import(mode) for _ in range(args.runs)]
+        boots = [measure_first_health(mode) for _ in range(args.runs)]
+        import_ms = statistics.median(seconds for seconds, _ in imports) * 1000
+        modules = imports[-1][1]
+        boot_ms = statistics.median(boots) * 1000
+        print(f"{mode:<12}{import_ms:>14.0f}{modules:>10}{boot_ms:>20.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -14,6 +14,16 @@ STORAGE_ACCOUNT_KEY = os.getenv('STORAGE_ACCOUNT_KEY', '')
 CONTAINER_NAME = os.getenv('CONTAINER_NAME', '')
 BLOB_NAME = os.getenv('BLOB_NAME', '')
 BLOB_NAME_PIB = os.getenv('BLOB_NAME_PIB', '')
+# Layout particionado opcional para radianza: un blob por año o año-mes bajo este prefijo
+# (p. ej. radianza/2019.csv o radianza/2019-03.csv). Si está vacío se usa BLOB_NAME.
+BLOB_PREFIX = os.getenv('BLOB_PREFIX', '')
+PARTITION_LOAD_WORKERS = int(os.getenv('PARTITION_LOAD_WORKERS', 4))  # Descargas en paralelo
+
+# Modo streaming (out-of-core) para radianza: el blob se lee por bloques, los agregados se
+# calculan de forma incremental y las filas se vuelcan a un Parquet local para lecturas filtradas
+STREAMING_MODE = os.getenv('STREAMING_MODE', 'False').lower() == 'true'
+SPILL_DIR = os.getenv('SPILL_DIR', '/tmp/radianza_spill')
+STREAM_BLOCK_BYTES = int(os.getenv('STREAM_BLOCK_BYTES', 16 * 1024 * 1024))  # Tamaño de bloque CSV
 
 # Configuración de Flask
 FLASK_ENV = os.getenv('FLASK_ENV', 'development')
@@ -22,12 +32,49 @@ FLASK_HOST = os.getenv('FLASK_HOST', '0.0.0.0')
 FLASK_PORT = int(os.getenv('PORT', os.getenv('FLASK_PORT', 5000)))
 FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
 
+# Arranque: 'background' importa pandas/pyarrow/azure en un hilo después de arrancar,
+# 'lazy' los importa en el primer uso y 'eager' al importar la app (comportamiento anterior)
+STARTUP_MODE = os.getenv('STARTUP_MODE', 'background').lower()
+
 # Configuración de CORS
 CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',')
 
 # Configuración de cache
 CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', 300))  # 5 minutos por defecto
 
+# Configuración de exportaciones asíncronas
+EXPORT_CACHE_DIR = os.getenv('EXPORT_CACHE_DIR', '/tmp/radianza_exports')
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))  # Hilos dedicados a exportaciones
+EXPORT_MAX_PENDING = int(os.getenv('EXPORT_MAX_PENDING', 16))  # Jobs en cola antes de rechazar
+EXPORT_CACHE_MAX_BYTES = int(os.getenv('EXPORT_CACHE_MAX_BYTES', 1024 * 1024 * 1024))  # 1 GB
+EXPORT_JOB_TTL_SECONDS = int(os.getenv('EXPORT_JOB_TTL_SECONDS', 3600))  # Jobs terminados que se recuerdan
+EXPORT_MAX_JOBS = int(os.getenv('EXPORT_MAX_JOBS', 256))
+
+# Configuración de compresión de respuestas
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))  # No comprimir respuestas pequeñas
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))  # Respuestas dinámicas
+
+# Control de admisión: carriles separados para consultas baratas y escaneos pesados.
+# Con gunicorn --threads 8, heavy (concurrencia + cola) debe dejar hilos libres para cheap.
+ADMISSION_CHEAP_CONCURRENCY = int(os.getenv('ADMISSION_CHEAP_CONCURRENCY', 8))
+ADMISSION_CHEAP_QUEUE = int(os.getenv('ADMISSION_CHEAP_QUEUE', 16))
+ADMISSION_CHEAP_WAIT_SECONDS = float(os.getenv('ADMISSION_CHEAP_WAIT_SECONDS', 2))
+ADMISSION_HEAVY_CONCURRENCY = int(os.getenv('ADMISSION_HEAVY_CONCURRENCY', 3))
+ADMISSION_HEAVY_QUEUE = int(os.getenv('ADMISSION_HEAVY_QUEUE', 2))
+ADMISSION_HEAVY_WAIT_SECONDS = float(os.getenv('ADMISSION_HEAVY_WAIT_SECONDS', 5))
+
+# Presupuesto de memoria para snapshots, índices y caches (MB)
+MEMORY_BUDGET_MB = int(os.getenv('MEMORY_BUDGET_MB', 1024))
+
+# Procesos para agregaciones pesadas (stats, comparison, /api/data); 0 = en el hilo de la petición
+COMPUTE_WORKERS = int(os.getenv('COMPUTE_WORKERS', 2))
+# Espera máxima por el resultado de una tarea en el pool antes de responder 503
+COMPUTE_TIMEOUT_SECONDS = float(os.getenv('COMPUTE_TIMEOUT_SECONDS', 120))
+
+# Versiones de cada snapshot cuyas huellas se conservan para /api/changes
+CHANGES_HISTORY_VERSIONS = int(os.getenv('CHANGES_HISTORY_VERSIONS', 8))
+
 # Validar que las credenciales críticas estén configuradas
 # No lanzar excepción aquí para permitir que la app inicie (fallará al usar blob storage)
 if not STORAGE_ACCOUNT_KEY:
@@ -14,7 +14,6 @@ const API_BASE_URL = import.meta.env.VITE_API_URL ||
   (import.meta.env.PROD ? '/api' : 'http://localhost:5000/api');
 
 const Dashboard = () => {
-  const [municipios, setMunicipios] = useState([]);
   const [selectedMunicipios, setSelectedMunicipios] = useState([]);
   const [selectedMetricas, setSelectedMetricas] = useState(['Media_de_radianza']);
   const [municipioData, setMunicipioData] = useState([]);
@@ -51,14 +50,14 @@ const Dashboard = () => {
       }
 
       const [municipiosRes, yearsRes] = await Promise.all([
-        axios.get(`${API_BASE_URL}/municipios`),
+        axios.get(`${API_BASE_URL}/municipios/search`, { params: { limit: 1 } }),
         axios.get(`${API_BASE_URL}/years`)
       ]);
 
       if (municipiosRes.data.success) {
-        setMunicipios(municipiosRes.data.municipios);
-        if (municipiosRes.data.municipios.length > 0) {
-          setSelectedMunicipios([municipiosRes.data.municipios[0]]);
+        // Solo el primer municipio para la selección inicial; el selector busca el resto
+        if (municipiosRes.data.matches.length > 0) {
+          setSelectedMunicipios([municipiosRes.data.matches[0].municipio]);
         }
       } else {
         console.error('Error en municipios:', municipiosRes.data.error);
@@ -235,7 +234,7 @@ const Dashboard = () => {
       <div className="dashboard-controls">
         <div className="controls-row">
           <MultiMunicipioSelector
-            municipios={municipios}
+            searchUrl={`${API_BASE_URL}/municipios/search`}
             selectedMunicipios={selectedMunicipios}
             onSelectMunicipios={setSelectedMunicipios}
           />
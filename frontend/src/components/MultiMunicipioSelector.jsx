@@ -1,10 +1,52 @@
 import React, { useState, useRef, useEffect } from 'react';
+import axios from 'axios';
 import './MultiMunicipioSelector.css';
 
-const MultiMunicipioSelector = ({ municipios, selectedMunicipios, onSelectMunicipios }) => {
+const SEARCH_LIMIT = 50;
+const SEARCH_DEBOUNCE_MS = 250;
+
+// Con `searchUrl` las opciones salen del endpoint de búsqueda en lugar de la lista completa
+const MultiMunicipioSelector = ({ municipios = [], searchUrl, selectedMunicipios, onSelectMunicipios }) => {
   const [isOpen, setIsOpen] = useState(false);
+  const [query, setQuery] = useState('');
+  const [matches, setMatches] = useState([]);
   const dropdownRef = useRef(null);
 
+  useEffect(() => {
+    if (!searchUrl || !isOpen) return undefined;
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(searchUrl, { params: { q: query, limit: SEARCH_LIMIT } });
+        if (!cancelled && response.data.success) {
+          // Un mismo nombre puede existir en varias entidades: una sola opción por nombre
+          // (los datos se piden por nombre) con sus entidades en la etiqueta
+          const byName = new Map();
+          response.data.matches.forEach(({ municipio, entidad_federativa: entidad }) => {
+            const entidades = byName.get(municipio) || [];
+            if (entidad && !entidades.includes(entidad)) entidades.push(entidad);
+            byName.set(municipio, entidades);
+          });
+          setMatches([...byName].map(([municipio, entidades]) => ({ municipio, entidades })));
+        }
+      } catch (err) {
+        console.error('Error al buscar municipios:', err);
+      }
+    }, SEARCH_DEBOUNCE_MS);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchUrl, query, isOpen]);
+
+  const options = searchUrl ? matches.map(match => match.municipio) : municipios;
+  const entidadesByName = new Map(matches.map(match => [match.municipio, match.entidades]));
+
+  const getOptionLabel = (municipio) => {
+    const entidades = searchUrl ? entidadesByName.get(municipio) : null;
+    return entidades && entidades.length > 0 ? `${municipio} (${entidades.join(', ')})` : municipio;
+  };
+
   useEffect(() => {
     const handleClickOutside = (event) => {
       if (dropdownRef.current && !dropdownRef.current.contains(event.target)) {
@@ -27,12 +69,14 @@ const MultiMunicipioSelector = ({ municipios, selectedMunicipios, onSelectMunici
     }
   };
 
+  const allOptionsSelected = options.length > 0 && options.every(m => selectedMunicipios.includes(m));
+
   const handleSelectAll = (e) => {
     e.stopPropagation();
-    if (selectedMunicipios.length === municipios.length) {
-      onSelectMunicipios([]);
+    if (allOptionsSelected) {
+      onSelectMunicipios(selectedMunicipios.filter(m => !options.includes(m)));
     } else {
-      onSelectMunicipios([...municipios]);
+      onSelectMunicipios([...selectedMunicipios, ...options.filter(m => !selectedMunicipios.includes(m))]);
     }
   };
 
@@ -43,7 +87,7 @@ const MultiMunicipioSelector = ({ municipios, selectedMunicipios, onSelectMunici
     if (selectedMunicipios.length === 1) {
       return selectedMunicipios[0];
     }
-    if (selectedMunicipios.length === municipios.length) {
+    if (!searchUrl && selectedMunicipios.length === municipios.length) {
       return 'Todos los municipios';
     }
     return `${selectedMunicipios.length} municipios seleccionados`;
@@ -64,24 +108,34 @@ const MultiMunicipioSelector = ({ municipios, selectedMunicipios, onSelectMunici
         {isOpen && (
           <div className="dropdown-menu">
             <div className="dropdown-header">
+              {searchUrl && (
+                <input
+                  type="text"
+                  className="dropdown-search"
+                  placeholder="Buscar municipio..."
+                  value={query}
+                  onChange={(e) => setQuery(e.target.value)}
+                  autoFocus
+                />
+              )}
               <label className="select-all-checkbox">
                 <input
                   type="checkbox"
-                  checked={selectedMunicipios.length === municipios.length}
+                  checked={allOptionsSelected}
                   onChange={handleSelectAll}
                 />
-                <span>Seleccionar todos</span>
+                <span>{searchUrl ? 'Seleccionar resultados' : 'Seleccionar todos'}</span>
               </label>
             </div>
             <div className="dropdown-list">
-              {municipios.map((municipio) => (
+              {options.map((municipio) => (
                 <label key={municipio} className="dropdown-option">
                   <input
                     type="checkbox"
                     checked={selectedMunicipios.includes(municipio)}
                     onChange={(e) => handleToggle(municipio, e)}
                   />
-                  <span>{municipio}</span>
+                  <span>{getOptionLabel(municipio)}</span>
                 </label>
               ))}
             </div>
@@ -13,7 +13,6 @@ const API_BASE_URL = import.meta.env.VITE_API_URL ||
 const SELECTED_METRICA = 'pib_mun';
 
 const PIBDashboard = () => {
-  const [municipios, setMunicipios] = useState([]);
   const [selectedMunicipios, setSelectedMunicipios] = useState([]);
   const [municipioData, setMunicipioData] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -44,12 +43,12 @@ const PIBDashboard = () => {
         return;
       }
 
-      const municipiosRes = await axios.get(`${API_BASE_URL}/pib/municipios`);
+      const municipiosRes = await axios.get(`${API_BASE_URL}/pib/municipios/search`, { params: { limit: 1 } });
 
       if (municipiosRes.data.success) {
-        setMunicipios(municipiosRes.data.municipios);
-        if (municipiosRes.data.municipios.length > 0) {
-          setSelectedMunicipios([municipiosRes.data.municipios[0]]);
+        // Solo el primer municipio para la selección inicial; el selector busca el resto
+        if (municipiosRes.data.matches.length > 0) {
+          setSelectedMunicipios([municipiosRes.data.matches[0].municipio]);
         }
       } else {
         console.error('Error en municipios:', municipiosRes.data.error);
@@ -189,7 +188,7 @@ const PIBDashboard = () => {
       <div className="dashboard-controls">
         <div className="controls-row">
           <MultiMunicipioSelector
-            municipios={municipios}
+            searchUrl={`${API_BASE_URL}/pib/municipios/search`}
             selectedMunicipios={selectedMunicipios}
             onSelectMunicipios={setSelectedMunicipios}
           />